@@ -1,27 +1,132 @@
-from sequenceAnalysis import CommandLine, FastAreader, OrfFinder
+from sequenceAnalysis import CommandLine, FastAreader, OrfFinder, OrfWriter, ProteinTable, Sequence
+from collections import deque
+
+def findRecord(seq, start, stop, minGene, longest = False, top = None):
+    '''
+    Worker process: find the ORFs of one whole record.
+    '''
+    ORF = OrfFinder(seq, start, stop, minGene, longest, top)
+    ORF.ORF_find()
+    return ORF.ORF
+
+def findWindow(seq, offset, begin, end, start, stop, minGene, longest = False, top = None):
+    '''
+    Worker process: find the ORFs of one window of a long record.
+    '''
+    return OrfFinder(None, start, stop, minGene, longest, top).findWindow(seq, offset, begin, end)
+
+def findParallel(records, args, writer, proteins = None, windowSize = 1 << 22):
+    '''
+    Search the records with args.jobs processes and write them in file order, the same as one process.
+    Records longer than windowSize are cut into windows that are searched at the same time and joined again.
+    Only a few records per process are in flight, so a big file is not read ahead into memory.
+    proteins is the ProteinTable the written ORFs are translated into, if any.
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+    settings = (args.start, args.stop, args.minGene, args.longestGene, args.top)
+    pending = deque()
+
+    def writeRecord():
+        # the oldest record is written first, waiting for its results if they are not in yet
+        header, seq, futures = pending.popleft()
+        ORF = OrfFinder(None, *settings)
+        if len(seq) <= windowSize:
+            ORF.ORF = futures[0].result()
+        else:
+            ORF.joinWindows([future.result() for future in futures], len(seq))
+        selected = ORF.ORF_select()
+        writer.write(header, selected)
+        if proteins is not None:
+            proteins.write(header, seq, selected)
+
+    with ProcessPoolExecutor(args.jobs) as pool:
+        for i, j in records:
+            if len(j) <= windowSize:
+                pending.append((i, j, [pool.submit(findRecord, j, *settings)]))
+            else:
+                # a window is read from far enough back to know the open starts and last stops where it begins, and 2 bases past its end
+                finder = OrfFinder(None, *settings)
+                futures = []
+                for begin in range(0, len(j), windowSize):
+                    end = min(begin + windowSize, len(j))
+                    offset = finder.safeStart(j, begin)
+                    futures.append(pool.submit(findWindow, j[offset:end + 2], offset, begin, end, *settings))
+                pending.append((i, j, futures))
+            while len(pending) > 4 * args.jobs:
+                writeRecord()
+        while pending:
+            writeRecord()
 
 def main(inFile = None, options = None):
     '''
     Find some genes.  
     '''
     thisCommandLine = CommandLine(options)
-    reader = FastAreader(inFile)    
+    # a file named on the command line is read when main is not given one. --contig needs a file, STDIN can not be indexed
+    if inFile is None:
+        inFile = thisCommandLine.args.inFile
+    if thisCommandLine.args.contig and inFile is None:
+        thisCommandLine.parser.error('--contig needs an input file, STDIN can not be indexed')
+    reader = FastAreader(inFile, asBytes=True)    
+    # thisCommandLine.args.format picks the output format, thisCommandLine.args.output the file (stdout by default)
+    writer = OrfWriter(thisCommandLine.args.format, thisCommandLine.args.output)
+    # thisCommandLine.args.proteins is the file for the protein table. the proteins need the whole sequence, which --stream does not keep
+    if thisCommandLine.args.proteins and thisCommandLine.args.stream:
+        thisCommandLine.parser.error('--proteins needs the whole sequences, it can not be used with --stream')
+    proteins = ProteinTable(thisCommandLine.args.proteins) if thisCommandLine.args.proteins else None
+
+    if thisCommandLine.args.stream:
+        # feed every record to its OrfFinder in blocks, a header means the previous record is done
+        header, ORF = None, None
+        for i, j in reader.readChunks():
+            if i is not None:
+                if ORF is not None:
+                    ORF.finish()
+                    writer.write(header, ORF.ORF_select())
+                header = i
+                ORF = OrfFinder(None, thisCommandLine.args.start, thisCommandLine.args.stop, thisCommandLine.args.minGene, thisCommandLine.args.longestGene, thisCommandLine.args.top)
+            ORF.feed(j)
+        if ORF is not None:
+            ORF.finish()
+            writer.write(header, ORF.ORF_select())
+        records = []
+    # thisCommandLine.args.contig names the records to search. they are fetched with the FastA index, otherwise the whole file is read
+    elif thisCommandLine.args.contig:
+        records = reader.readRecords(thisCommandLine.args.contig)
+    else:
+        records = reader.readFasta()
+
+    # more than one job searches the records in worker processes, the output stays in file order
+    if thisCommandLine.args.jobs > 1:
+        findParallel(records, thisCommandLine.args, writer, proteins)
+        records = []
 
     # loop through readFasta file where i is the header and j is the sequence
-    for i, j in reader.readFasta():
-        print(i)
+    for i, j in records:
+        # the record is encoded once, the ORF search and the translation share it
+        j = Sequence(j)
         # thisCommandLine.args.longestGene is True if only the longest Gene is desired
         # thisCommandLine.args.start is a list of start codons
         # thisCommandLine.args.stop is a list of stop codons
         # thisCommandLine.args.minGene is the minimum Gene length to include
-        ORF = OrfFinder(j, thisCommandLine.args.start, thisCommandLine.args.stop, thisCommandLine.args.minGene)
-        # call function ORF_find() and ORF_final() to perform its functions
+        # thisCommandLine.args.top is how many of the longest Genes to print, None prints all
+        ORF = OrfFinder(j, thisCommandLine.args.start, thisCommandLine.args.stop, thisCommandLine.args.minGene, thisCommandLine.args.longestGene, thisCommandLine.args.top)
+        # call function ORF_find() to find the ORFs and ORF_select() to pick the ones that are written
         ORF.ORF_find()
-        ORF.ORF_final()
+        selected = ORF.ORF_select()
+        writer.write(i, selected)
+        # translate the written ORFs of the record while its sequence is still here
+        if proteins is not None:
+            proteins.write(i, j, selected)
+    writer.close()
+    if proteins is not None:
+        proteins.close()
 
     ###### replace the code between comments.
-    print (thisCommandLine.args)
+    # the options end the text output, the other formats are for other tools to load
+    if thisCommandLine.args.format == 'text':
+        print (thisCommandLine.args)
     #######
     
 if __name__ == "__main__":
-    main(options = ['-mG=300', '-lG']) # delete this stuff if running from commandline
\ No newline at end of file
+    main()
\ No newline at end of file
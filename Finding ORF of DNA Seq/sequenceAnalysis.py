@@ -29,18 +29,30 @@ class CommandLine() :
                                              epilog = 'Program epilog - some other stuff you feel compelled to say', 
                                              add_help = True, #default is True 
                                              prefix_chars = '-', 
-                                             usage = '%(prog)s [options] -option1[default] <input >output'
+                                             usage = '%(prog)s [options] -option1[default] [input.fa] <input >output'
                                              )
-        self.parser.add_argument('-lG', '--longestGene', action = 'store', nargs='?', const=True, default=False, help='longest Gene in an ORF')
+        self.parser.add_argument('inFile', nargs='?', default=None, help='FastA file to search, STDIN when left out')
+        self.parser.add_argument('-lG', '--longestGene', action = 'store_true', default=False, help='longest Gene in an ORF')
         self.parser.add_argument('-mG', '--minGene', type=int, choices= (100,200,300,500,1000), default=100, action = 'store', help='minimum Gene length')
-        self.parser.add_argument('-s', '--start', action = 'append', default = ['ATG'],nargs='?', 
-                                 help='start Codon') #allows multiple list options
-        self.parser.add_argument('-t', '--stop', action = 'append', default = ['TAG','TGA','TAA'],nargs='?', help='stop Codon') #allows multiple list options
+        self.parser.add_argument('-s', '--start', action = 'append', default = None, 
+                                 help='start Codon, ATG when none are given. repeat it or give a list like ATG,GTG,TTG') #allows multiple list options
+        self.parser.add_argument('-t', '--stop', action = 'append', default = None, 
+                                 help='stop Codon, TAG,TGA,TAA when none are given. the list replaces them, so -t TAA,TAG reads TGA as Trp') #allows multiple list options
+        self.parser.add_argument('-f', '--format', choices=('text', 'tsv', 'bed', 'gff3', 'npz'), default='text', help='ORF output format')
+        self.parser.add_argument('-o', '--output', default=None, help='file to write the ORFs to, stdout by default')
+        self.parser.add_argument('-p', '--proteins', default=None, help='file to write the translated ORFs to, with their weight, extinction and pI')
+        self.parser.add_argument('--top', type=int, default=None, help='only print the K longest genes, one per stop codon')
+        self.parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes that search records (and windows of long records) at the same time')
+        self.parser.add_argument('--stream', action = 'store_true', default = False, help='read the sequences in blocks, memory stays the same for any contig length')
+        self.parser.add_argument('-c', '--contig', action = 'append', default = None, 
+                                 help='only search this FastA record, found through the .fai index (needs an input file)') #allows multiple list options
         self.parser.add_argument('-v', '--version', action='version', version='%(prog)s 0.1')  
         if inOpts is None :
             self.args = self.parser.parse_args()
         else :
             self.args = self.parser.parse_args(inOpts)
+        if self.args.top is not None and self.args.top < 1 :
+            self.parser.error('argument --top: K must be at least 1')
 
 import sys
 class FastAreader :
@@ -52,43 +64,1227 @@ class FastAreader :
     usage:
     for head, seq in thisReader.readFasta():
         print (head,seq)
+
+    The file is read in large binary blocks and every record is joined once, so reading time grows
+    linearly with the file size. With asBytes=True the sequences are returned as uppercase bytes,
+    which NucParams.addSequence and OrfFinder accept directly. readChunks returns the records in pieces
+    of about blockSize bases instead, for NucParams.feed.
+
+    random access:
+    thisReader.fetch('chr1', 1000, 2000) returns bases 1000 up to (not including) 2000 of record chr1.
+    It uses a samtools compatible .fai index that is built on first use and saved next to the file.
+
+    memory mapped:
+    for head, seq in thisReader.mapFasta():
+        print (head, len(seq), seq[0:60])
+    Every record is a MappedSequence over one shared read only mmap of the file, so nothing is copied until bases are used.
+
+    compressed files:
+    gzip and BGZF (bgzip) files are recognized by their first bytes and read without unpacking them to disk first.
+    BGZF blocks are decompressed in parallel by a BgzfReader, which can also seek, so fetch works on BGZF files too.
     '''
-    def __init__ (self, fname=None):
-        '''contructor: saves attribute fname '''
+    # whitespace removed from sequence lines, same set that str.split() drops
+    whitespace = b' \t\n\r\x0b\x0c'
+
+    def __init__ (self, fname=None, asBytes=False, blockSize=1 << 20, threads=None):
+        '''contructor: saves attribute fname, the output type, the size of the blocks read from the file and the number of BGZF decompression threads '''
         self.fname = fname
+        self.asBytes = asBytes
+        self.blockSize = blockSize
+        self.threads = threads
+        # name -> (length, offset, lineBases, lineWidth), filled by loadIndex
+        self.index = None
+            
+    def compression (self):
+        ''' Return 'bgzf', 'gzip' or None for fname, recognized from the magic bytes at the start of the file. '''
+        if self.fname is None:
+            return None
+        with open(self.fname, 'rb') as fileH:
+            magic = fileH.read(18)
+        if not magic.startswith(b'\x1f\x8b'):
+            return None
+        # BGZF is gzip with the FEXTRA flag and a 'BC' extra field holding the block size
+        return 'bgzf' if len(magic) == 18 and magic[3] & 4 and magic[12:14] == b'BC' else 'gzip'
             
-    def doOpen (self):
-        ''' Handle file opens, allowing STDIN.'''
+    def doOpen (self, mode='r'):
+        ''' Handle file opens, allowing STDIN. gzip and BGZF files are decompressed on the fly.'''
+        import gzip
         if self.fname is None:
-            return sys.stdin
+            # the binary modes need the raw buffer underneath sys.stdin
+            if 'b' not in mode:
+                return sys.stdin
+            if sys.stdin.buffer.peek(2)[:2] == b'\x1f\x8b':
+                return gzip.GzipFile(fileobj=sys.stdin.buffer)
+            return sys.stdin.buffer
+
+        compression = self.compression()
+        if compression == 'bgzf':
+            fileH = io.BufferedReader(BgzfReader(self.fname, self.threads), self.blockSize)
+        elif compression == 'gzip':
+            fileH = gzip.open(self.fname, 'rb')
         else:
-            return open(self.fname)
+            return open(self.fname, mode)
+        return fileH if 'b' in mode else io.TextIOWrapper(fileH)
+
+    def _record (self, header, parts):
+        ''' Join the collected sequence fragments of one record, drop whitespace and uppercase it in a single pass. '''
+        sequence = b''.join(parts).translate(None, FastAreader.whitespace).upper()
+        if not self.asBytes:
+            sequence = sequence.decode('latin-1')
+        return header.rstrip().decode(), sequence
         
+    def mapFasta (self, names=None):
+        ''' Memory map the file and return the header and a MappedSequence of every record, or only of the named records. 
+        The index gives the line layout used to skip the newlines. '''
+        import mmap
+        if self.compression() is not None:
+            raise ValueError('{} is compressed and can not be memory mapped, use readFasta or fetch instead'.format(self.fname))
+        index = self.loadIndex()
+        with self.doOpen('rb') as fileH:
+            # the map stays valid after the file is closed. it is read only, so processes mapping the same file share its pages
+            mapped = mmap.mmap(fileH.fileno(), 0, access=mmap.ACCESS_READ)
+
+        for name in (index if names is None else names):
+            length, offset, lineBases, lineWidth = index[name]
+            # the header line ends right before the first base, look back for its '>'
+            headStart = mapped.rfind(b'\n>', 0, offset - 1) + 1
+            header = mapped[headStart + 1:offset].rstrip().decode()
+            yield header, MappedSequence(mapped, offset, length, lineBases, lineWidth)
+
+    def readRecords (self, names):
+        ''' Return the name/sequence of the named records only, read with fetch instead of streaming the whole file. '''
+        for name in names:
+            yield name, self.fetch(name)
+
+    def _scan (self, start=None, end=None):
+        ''' Walk the file in blocks. yields (header, None) for every header line and (None, part) for the raw sequence lines of the current record.
+        start and end limit the walk to that byte range of the file. '''
+        # nothing is yielded until the first fasta header is found, so anything before it is skipped
+        inRecord = False
+
+        with self.doOpen('rb') as fileH:
+            if start:
+                fileH.seek(start)
+            # bytes left to read in the range, None reads to the end of the file
+            left = None if end is None else end - (start or 0)
+            tail = b''
+            # True when the previous block ended in the middle of a sequence line
+            midLine = False
+            while True:
+                block = fileH.read(self.blockSize if left is None else min(self.blockSize, left))
+                if left is not None:
+                    left -= len(block)
+                # at the end of the file finish the last line, even if it has no newline
+                if not block:
+                    if not tail:
+                        break
+                    block = b'\n'
+                buf = tail + block
+                pos = 0
+                if midLine:
+                    # the start of this block continues the sequence line cut off by the previous block
+                    pos = buf.find(b'\n') + 1 or len(buf)
+                    if inRecord:
+                        yield None, buf[:pos]
+                    midLine = pos == len(buf) and not buf.endswith(b'\n')
+                # only whole lines are handled here, the partial last line is carried over to the next block
+                end = max(buf.rfind(b'\n') + 1, pos)
+                tail = buf[end:]
+
+                while pos < end:
+                    if buf[pos] == 62: # '>' starts a header line
+                        eol = buf.find(b'\n', pos)
+                        inRecord = True
+                        yield buf[pos + 1:eol], None
+                        pos = eol + 1
+                    else:
+                        # everything up to the next header line belongs to the current sequence
+                        nxt = buf.find(b'\n>', pos, end)
+                        nxt = end if nxt == -1 else nxt + 1
+                        if inRecord:
+                            yield None, buf[pos:nxt]
+                        pos = nxt
+
+                # a partial sequence line is handed over right away so very long lines are never copied twice
+                if tail and tail[0] != 62:
+                    if inRecord:
+                        yield None, tail
+                    tail = b''
+                    midLine = True
+
     def readFasta (self):
         ''' Read an entire FastA record and return the sequence header/sequence'''
-        header = ''
-        sequence = ''
-        
-        with self.doOpen() as fileH:
-            
-            header = ''
-            sequence = ''
-            
-            # skip to first fasta header
-            line = fileH.readline()
-            while not line.startswith('>') :
-                line = fileH.readline()
-            header = line[1:].rstrip()
+        header = None
+        parts = []
+        for head, part in self._scan():
+            if head is not None:
+                if header is not None:
+                    yield self._record(header, parts)
+                header = head
+                parts = []
+            else:
+                parts.append(part)
 
+        if header is not None:
+            yield self._record(header, parts)
+
+    def readChunks (self, start=None, end=None):
+        ''' Return the file as (header, chunk) pieces of about blockSize bases, so a record never has to be held in memory as a whole.
+        The first chunk of every record carries its header (and may be empty), the chunks after it have None as header.
+        start and end limit reading to a byte range, like the ones from splitRanges. '''
+        for head, part in self._scan(start, end):
+            if head is not None:
+                yield head.rstrip().decode(), b'' if self.asBytes else ''
+            else:
+                chunk = part.translate(None, FastAreader.whitespace).upper()
+                yield None, chunk if self.asBytes else chunk.decode('latin-1')
+
+    def splitRanges (self, parts):
+        ''' Cut the file into about parts byte ranges (start, end) that each begin at a header line, so every record lies in exactly one range. '''
+        if self.fname is None or self.compression() == 'gzip':
+            raise ValueError('only uncompressed or BGZF files can be split into byte ranges')
+        with self.doOpen('rb') as fileH:
+            size = fileH.seek(0, io.SEEK_END)
+            bounds = [0]
+            for part in range(1, parts):
+                pos = max(size * part // parts, bounds[-1])
+                # move forward to the next line that starts with '>', looking from the byte before pos in case pos is already on one
+                fileH.seek(max(pos - 1, 0))
+                while True:
+                    block = fileH.read(1 << 16)
+                    found = block.find(b'\n>')
+                    if found != -1:
+                        pos = fileH.tell() - len(block) + found + 1
+                        break
+                    if len(block) < 1 << 16:
+                        pos = size
+                        break
+                    # step back one byte, a newline at the end could pair with a '>' at the start of the next block
+                    fileH.seek(-1, io.SEEK_CUR)
+                if pos >= size:
+                    break
+                bounds.append(pos)
+            bounds.append(size)
+        return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+    def buildIndex (self):
+        ''' Scan the file once and write the samtools style index (name, length, offset, line bases, line width) to fname.fai. '''
+        if self.fname is None:
+            raise ValueError('a FastA index needs a file name, STDIN can not be indexed')
+        index = {}
+        with self.doOpen('rb') as fileH:
+            # offset is the byte position of the current line in the file
+            offset = 0
+            name = None
             for line in fileH:
-                if line.startswith ('>'):
-                    yield header,sequence
-                    header = line[1:].rstrip()
-                    sequence = ''
-                else :
-                    sequence += ''.join(line.rstrip().split()).upper()
+                if line.startswith(b'>'):
+                    # the record name is the first word of the header
+                    name = line[1:].split(maxsplit=1)[0].decode() if line[1:].strip() else ''
+                    if name in index:
+                        raise ValueError('duplicate FastA record name: {}'.format(name))
+                    # [length, offset of the first base, bases per line, bytes per line]
+                    index[name] = [0, offset + len(line), 0, 0]
+                    # set once a line shorter than the others is seen, only the last line of a record may be short
+                    done = False
+                elif name is not None:
+                    bases = len(line.rstrip(b'\r\n'))
+                    record = index[name]
+                    if not bases:
+                        # a blank line ends the sequence lines of the record
+                        done = True
+                    elif done or bases > record[2] > 0 or (bases == record[2] and line.endswith(b'\n') and len(line) != record[3]):
+                        raise ValueError('FastA record {} has lines of different lengths and can not be indexed'.format(name))
+                    elif record[2] == 0:
+                        record[2], record[3] = bases, len(line)
+                    elif bases < record[2]:
+                        done = True
+                    record[0] += bases
+                offset += len(line)
+
+        try:
+            with open(self.fname + '.fai', 'w') as faiH:
+                for name, (length, start, lineBases, lineWidth) in index.items():
+                    faiH.write('{}\t{}\t{}\t{}\t{}\n'.format(name, length, start, lineBases, lineWidth))
+        except OSError:
+            # the index file is only a shortcut, in a read only directory the index is kept in memory and rebuilt next time
+            pass
+        self.index = {name: tuple(record) for name, record in index.items()}
+        return self.index
+
+    def loadIndex (self):
+        ''' Read fname.fai, building it first when it is missing or older than the FastA file. '''
+        import os
+        if self.compression() == 'gzip':
+            raise ValueError('{} is plain gzip and can not be read at random positions, compress it with bgzip instead'.format(self.fname))
+        if self.index is None:
+            fai = self.fname + '.fai' if self.fname is not None else None
+            if fai is None or not os.path.exists(fai) or os.path.getmtime(fai) < os.path.getmtime(self.fname):
+                return self.buildIndex()
+            self.index = {}
+            with open(fai) as faiH:
+                for line in faiH:
+                    name, length, start, lineBases, lineWidth = line.rstrip('\n').split('\t')[:5]
+                    self.index[name] = (int(length), int(start), int(lineBases), int(lineWidth))
+        return self.index
+
+    def fetch (self, name, start=None, end=None):
+        ''' Return bases start up to end (0-based, end excluded, like a python slice) of record name, seeking straight to them with the index. '''
+        if name not in self.loadIndex():
+            raise KeyError('no FastA record named {}'.format(name))
+        length, offset, lineBases, lineWidth = self.index[name]
+        # clamp the requested range to the record
+        start = 0 if start is None else min(max(start, 0), length)
+        end = length if end is None else min(max(end, start), length)
+
+        sequence = b''
+        if start < end:
+            # turn base positions into byte positions, every full line adds lineWidth bytes
+            first = offset + start // lineBases * lineWidth + start % lineBases
+            last = offset + (end - 1) // lineBases * lineWidth + (end - 1) % lineBases + 1
+            with self.doOpen('rb') as fileH:
+                fileH.seek(first)
+                sequence = fileH.read(last - first).translate(None, FastAreader.whitespace).upper()
+        return sequence if self.asBytes else sequence.decode('latin-1')
+
+class MappedSequence :
+    ''' 
+    One FastA record inside a memory mapped file, made by FastAreader.mapFasta.
+
+    usage:
+    len(seq) is the number of bases, seq[a:b] returns the uppercase bytes of bases a up to b without newlines,
+    bytes(seq) returns the whole record and seq.chunks(size) walks it in blocks of size bases.
+    Only the part that is asked for is copied out of the map.
+    '''
+    def __init__ (self, mapped, offset, length, lineBases, lineWidth):
+        '''constructor: saves the map and the layout of the record taken from the .fai index '''
+        self.mapped = mapped
+        self.offset = offset
+        self.length = length
+        self.lineBases = lineBases
+        self.lineWidth = lineWidth
+
+    def __len__ (self):
+        return self.length
+
+    def _bytePos (self, pos):
+        ''' Position of base pos in the file. every full line before it adds lineWidth bytes. '''
+        return self.offset + pos // self.lineBases * self.lineWidth + pos % self.lineBases
+
+    def __getitem__ (self, key):
+        ''' Return the bases of the slice key as uppercase bytes with the newlines dropped. '''
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError('MappedSequence only supports slices with step 1')
+        start, end, step = key.indices(self.length)
+        if start >= end:
+            return b''
+        raw = self.mapped[self._bytePos(start):self._bytePos(end - 1) + 1]
+        return raw.translate(None, FastAreader.whitespace).upper()
+
+    def __bytes__ (self):
+        return self[:]
+
+    @property
+    def raw (self):
+        ''' Zero copy memoryview of the record as it is stored in the file, newlines included. '''
+        return memoryview(self.mapped)[self.offset:self._bytePos(self.length - 1) + 1 if self.length else self.offset]
+
+    def chunks (self, size=1 << 20):
+        ''' Return the record as consecutive blocks of size bases, so a whole chromosome never has to be copied at once. '''
+        for start in range(0, self.length, size):
+            yield self[start:start + size]
+
+import io
+class BgzfReader (io.RawIOBase) :
+    ''' 
+    Read a BGZF (bgzip) file as if it were not compressed, made by FastAreader.doOpen.
+
+    BGZF is a series of small gzip blocks. The start of every block is kept in a table that is saved
+    as a samtools compatible fname.gzi, so seek can jump to any uncompressed position. While the file
+    is read in order, the next blocks are decompressed ahead of time on a thread pool (zlib releases the GIL).
+    '''
+    def __init__ (self, fname, threads=None, readAhead=None):
+        '''constructor: opens fname, loads the block table and starts the decompression threads '''
+        import os
+        from concurrent.futures import ThreadPoolExecutor
+        super().__init__()
+        self.fname = fname
+        self.fd = os.open(fname, os.O_RDONLY)
+        threads = threads or os.cpu_count()
+        self.pool = ThreadPoolExecutor(threads)
+        # how many blocks are decompressed ahead of a sequential reader
+        self.readAhead = readAhead or 4 * threads
+        # block number -> future of its decompressed data
+        self.pending = {}
+        # (block number, data) of the block the reader is in
+        self.current = None
+        self.lastBlock = -1
+        self.pos = 0
+        self.loadBlocks()
+
+    def loadBlocks (self):
+        ''' Fill the compressed and uncompressed start of every block, from fname.gzi when it is up to date, otherwise by walking the block headers. '''
+        import os, struct
+        gzi = self.fname + '.gzi'
+        fileSize = os.fstat(self.fd).st_size
+        if os.path.exists(gzi) and os.path.getmtime(gzi) >= os.path.getmtime(self.fname):
+            with open(gzi, 'rb') as gziH:
+                count, = struct.unpack('<Q', gziH.read(8))
+                pairs = struct.unpack('<{}Q'.format(2 * count), gziH.read(16 * count))
+            # the .gzi leaves out the first block, which always starts at 0, 0
+            offsets = [(0, 0)] + list(zip(pairs[0::2], pairs[1::2]))
+        else:
+            offsets = []
+            cPos = uPos = 0
+            while cPos < fileSize:
+                offsets.append((cPos, uPos))
+                blockSize, inflatedSize = self._blockSizes(cPos)
+                cPos += blockSize
+                uPos += inflatedSize
+            offsets = offsets or [(0, 0)]
+            try:
+                with open(gzi, 'wb') as gziH:
+                    gziH.write(struct.pack('<Q', len(offsets) - 1))
+                    for pair in offsets[1:]:
+                        gziH.write(struct.pack('<QQ', *pair))
+            except OSError:
+                # the table is only a shortcut, a read only directory just means it is rebuilt next time
+                pass
+
+        self.cStarts = [c for c, u in offsets] + [fileSize]
+        self.uStarts = [u for c, u in offsets]
+        # the size of the data in the last block is stored in the last 4 bytes of the file
+        lastSize = struct.unpack('<I', os.pread(self.fd, 4, fileSize - 4))[0] if fileSize >= 4 else 0
+        self.size = self.uStarts[-1] + lastSize
+
+    def _blockSizes (self, cPos):
+        ''' Return the compressed size of the block at cPos, read from its BC extra field, and its uncompressed size. '''
+        import os, struct
+        header = os.pread(self.fd, 12, cPos)
+        if header[:2] != b'\x1f\x8b' or not header[3] & 4:
+            raise ValueError('{} is not a BGZF file, block at {} has no extra field'.format(self.fname, cPos))
+        extraLength, = struct.unpack('<H', header[10:12])
+        extra = os.pread(self.fd, extraLength, cPos + 12)
+        # walk the extra subfields until the BC one that holds the block size - 1
+        i = 0
+        while i + 4 <= len(extra):
+            fieldLength, = struct.unpack('<H', extra[i + 2:i + 4])
+            if extra[i:i + 2] == b'BC':
+                blockSize = struct.unpack('<H', extra[i + 4:i + 6])[0] + 1
+                inflatedSize, = struct.unpack('<I', os.pread(self.fd, 4, cPos + blockSize - 4))
+                return blockSize, inflatedSize
+            i += 4 + fieldLength
+        raise ValueError('{} is not a BGZF file, block at {} has no BC field'.format(self.fname, cPos))
+
+    def _inflate (self, block):
+        ''' Read and decompress one block. runs on the thread pool, os.pread and zlib both work without the GIL. '''
+        import os, struct, zlib
+        data = os.pread(self.fd, self.cStarts[block + 1] - self.cStarts[block], self.cStarts[block])
+        extraLength, = struct.unpack('<H', data[10:12])
+        # raw deflate data sits between the header with its extra field and the 8 byte CRC/size trailer
+        return zlib.decompress(data[12 + extraLength:-8], -15)
+
+    def _block (self, block):
+        ''' Return the data of one block, keeping the next blocks decompressing while the file is read in order. '''
+        if block == self.lastBlock + 1:
+            for ahead in range(block, min(block + self.readAhead, len(self.uStarts))):
+                if ahead not in self.pending:
+                    self.pending[ahead] = self.pool.submit(self._inflate, ahead)
+        # after a seek the blocks decompressed ahead are no longer needed
+        for skipped in [ahead for ahead in self.pending if ahead < block or ahead >= block + self.readAhead]:
+            self.pending.pop(skipped).cancel()
+        future = self.pending.pop(block, None)
+        self.lastBlock = block
+        return future.result() if future else self._inflate(block)
+
+    def readable (self):
+        return True
+
+    def seekable (self):
+        return True
+
+    def tell (self):
+        return self.pos
+
+    def seek (self, offset, whence=io.SEEK_SET):
+        ''' Move to an uncompressed position. '''
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.pos = max(offset, 0)
+        return self.pos
+
+    def readinto (self, buffer):
+        ''' Copy data from the current position into buffer, at most up to the end of the current block. '''
+        import bisect
+        if self.pos >= self.size:
+            return 0
+        block = bisect.bisect_right(self.uStarts, self.pos) - 1
+        if self.current is None or self.current[0] != block:
+            self.current = (block, self._block(block))
+        data = self.current[1]
+        inner = self.pos - self.uStarts[block]
+        count = min(len(buffer), len(data) - inner)
+        buffer[:count] = data[inner:inner + count]
+        self.pos += count
+        return count
+
+    def close (self):
+        ''' Stop the decompression threads and close the file. '''
+        import os
+        if not self.closed:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            os.close(self.fd)
+        super().close()
+
+try:
+    import numpy as np
+except ImportError:
+    # without numpy, OrfFinder scans with the pure python scanStrand, NucParams counts and ProteinTable translates in plain python
+    np = None
+from collections import Counter
+from array import array
+class ProteinParam :
+# These tables are for calculating:
+#     molecular weight (aa2mw), along with the mol. weight of H2O (mwH2O)
+#     absorbance at 280 nm (aa2abs280)
+#     pKa of positively charged Amino Acids (aa2chargePos)
+#     pKa of negatively charged Amino acids (aa2chargeNeg)
+#     and the constants aaNterm and aaCterm for pKa of the respective termini
+#  Feel free to move these to appropriate methods as you like
+
+# As written, these are accessed as class attributes, for example:
+# ProteinParam.aa2mw['A'] or ProteinParam.mwH2O
+
+    aa2mw = {
+        'A': 89.093,  'G': 75.067,  'M': 149.211, 'S': 105.093, 'C': 121.158,
+        'H': 155.155, 'N': 132.118, 'T': 119.119, 'D': 133.103, 'I': 131.173, 
+        'P': 115.131, 'V': 117.146, 'E': 147.129, 'K': 146.188, 'Q': 146.145,
+        'W': 204.225,  'F': 165.189, 'L': 131.173, 'R': 174.201, 'Y': 181.189
+        }
+
+    mwH2O = 18.015
+    aa2abs280= {'Y':1490, 'W': 5500, 'C': 125}
+
+    aa2chargePos = {'K': 10.5, 'R':12.4, 'H':6}
+    aa2chargeNeg = {'D': 3.86, 'E': 4.25, 'C': 8.33, 'Y': 10}
+    aaNterm = 9.69
+    aaCterm = 2.34
+
+    # the charge model used by _charge_ and pI: the counts of the 7 ionizable amino acids (positive ones first) and their 10 ** pKa,
+    # computed once here instead of in every _charge_ call
+    ionizable = tuple(aa2chargePos) + tuple(aa2chargeNeg)
+    posPowers = tuple(map((10.0).__pow__, aa2chargePos.values()))
+    negPowers = tuple(map((10.0).__pow__, aa2chargeNeg.values()))
+    ntermPower = 10 ** aaNterm
+    ctermPower = 10 ** aaCterm
+    # ionizable counts -> pH of zero charge, shared by all proteins. proteomes have many proteins with the same counts
+    pICache = {}
+    # the most entries pICache holds, the oldest are dropped first. about 13 MB when full
+    pICacheSize = 1 << 16
+
+    # the valid amino acids in the order of aa_dict, which is the order of the counts array, and the position of each one
+    aaOrder = 'ACDEFGHILKMNPQRSTVYW'
+    aaIndex = {aa: index for index, aa in enumerate(aaOrder)}
+
+    # a ProteinParam only holds these, no __dict__, so hundreds of thousands of them stay small.
+    # counts is the fixed array of the 20 amino acid counts, _weight and _root are filled in the first time they are needed
+    __slots__ = ('protein', 'counts', '_weight', '_root')
+
+    def __init__ (self, protein):
+        # ignore any spaces in the inputted protein and transform any lowercase letters to uppercase
+        self.protein = protein.strip().upper()
+        # count every valid amino acid with a C level str.count, no python loop over the residues. invalid characters are never counted
+        self.counts = array('I', map(self.protein.count, ProteinParam.aaOrder))
+        self._weight = None
+        self._root = None
+
+    @property
+    def aa_dict (self):
+        ''' The count of every valid amino acid as a dictionary, made from the counts array. '''
+        return dict(zip(ProteinParam.aaOrder, self.counts))
+
+    def init_aaComposition (self) :
+        ''' This method finds the count of each valid amino acid in the inputted protein sequence. The counting is done once in __init__.
+
+        Example:
+            input: VLSPADKTNVKAAW
+            output: {"A" : 3, "C" : 0, "D" : 1, "E" : 0, "F" : 0, "G" : 0, "H" : 0, "I" : 0, "L" : 1, "K" : 2, 
+                        "M" : 0, "N" : 1, "P" : 1, "Q" : 0, "R" : 0, "S" : 1, "T" : 1, "V" : 2, "Y" : 0, "W" : 1}
+
+        '''
+        return self.aa_dict
+
+    def aaCount (self):
+        ''' This method will return a single integer count of valid amino acid characters found. Ignores spaces and invalid characters. 
+        
+        Example:
+            input: VLSPADKTNVKAAW
+            output: 14
+        '''
+        # the sum of the counts array, every valid amino acid was counted in __init__
+        return sum(self.counts)
+
+    '''
+    ORIGINAL PI (using a different approach)
+    def pI (self):
+        i = 0
+        lst = []
+        while i <= 14:
+            lst.append(round(i, 2))
+            i += 0.01
+
+        # any charge calculated after will have to be smaller than infinity
+        start = float('inf')
+        # starting point, an initialization
+        smallest_net = 0
+        #smallest_net = self._charge_(start)
+        for i in lst: 
+            # it will have to be smaller than infinity
+            if abs(self._charge_(i)) < abs(start):
+                start = abs(self._charge_(i))
+                smallest_net = i
+
+        return round(smallest_net, 2)
+        pass
+    '''
+    
+    def pI(self, precision = 2):
+        ''' This method finds the pH that yields a neutral net Charge that is closest to 0. The pH of zero charge is solved with solveCharge
+        (memoized by the ionizable counts), then the binary search over 0-14 that pI always used is replayed against it: every middle below the
+        zero charge pH has a positive charge and moves low up, every middle above it moves high down. So the pI is the same as the search
+        that called _charge_ at every step, for any precision, without calling it at all. '''
+        # the zero charge pH is kept after the first pI, so another precision only replays the search
+        if self._root is None:
+            self._root = self.solveCharge(self.ionizableCounts())
+        return self.bisectTo(self._root, precision)
+
+    @staticmethod
+    def bisectTo(root, precision = 2):
+        ''' The binary search over 0-14 for a charge that crosses zero at pH root, until low and high are closer than 10^-precision. '''
+        # set the lower and upper bounds for binary search
+        low = 0.0
+        high = 14.0
+        # set the precision which is 10^-2 = 0.01
+        prec = 10 ** (-precision)
+        while high - low > prec:
+            middle = (low + high) / 2
+            # the charge is exactly zero in the middle
+            if middle == root:
+                return round(middle, precision)
+            # the charge falls with the pH, so it is still positive below the root
+            if middle < root:
+                low = middle
+            else:
+                high = middle
+        # round the final pI to 2 decimal places
+        return round((high + low) / 2, precision)
+
+    def ionizableCounts (self):
+        ''' The counts of the ionizable amino acids, in the order of ProteinParam.ionizable. '''
+        return tuple(self.counts[ProteinParam.aaIndex[aa]] for aa in ProteinParam.ionizable)
+
+    @classmethod
+    def chargeSlope (cls, counts, pH):
+        ''' Net charge and its derivative by pH of a protein with these ionizable counts. '''
+        H = 10 ** pH
+        charge = cls.ntermPower / (cls.ntermPower + H) - H / (cls.ctermPower + H)
+        slope = cls.ntermPower / (cls.ntermPower + H) ** 2 + cls.ctermPower / (cls.ctermPower + H) ** 2
+        for count, power in zip(counts, cls.posPowers):
+            charge += count * power / (power + H)
+            slope += count * power / (power + H) ** 2
+        for count, power in zip(counts[len(cls.posPowers):], cls.negPowers):
+            charge -= count * H / (power + H)
+            slope += count * power / (power + H) ** 2
+        # d/dpH of 10^pKa / (10^pKa + 10^pH) is -ln(10) 10^pKa 10^pH / (10^pKa + 10^pH)^2, the negative groups fall the same way
+        return charge, -2.302585092994046 * H * slope
+
+    @classmethod
+    def solveCharge (cls, counts):
+        ''' The pH where the charge is zero, by Newton steps on the smooth falling charge curve. A step that would leave the bracket of
+        known positive and negative charge bisects it instead. The charge has no zero inside 0-14 for extreme proteins, which gives inf:
+        the old binary search then ran up to 14. The latest pICacheSize results are kept in pICache by the counts. '''
+        if counts in cls.pICache:
+            return cls.pICache[counts]
+        if cls.chargeSlope(counts, 0.0)[0] < 0 or cls.chargeSlope(counts, 14.0)[0] > 0:
+            root = float('inf')
+        else:
+            low, high, root = 0.0, 14.0, 7.0
+            for step in range(200):
+                charge, slope = cls.chargeSlope(counts, root)
+                if charge == 0:
+                    break
+                if charge > 0:
+                    low = root
+                else:
+                    high = root
+                newton = root - charge / slope if slope else low
+                # the Newton step is already below the float resolution of the pH
+                if abs(newton - root) < 1e-13 or high - low < 1e-13:
+                    root = newton if low <= newton <= high else root
+                    break
+                root = newton if low < newton < high else (low + high) / 2
+        if len(cls.pICache) >= cls.pICacheSize:
+            # dicts keep insertion order, so the first key is the oldest result
+            del cls.pICache[next(iter(cls.pICache))]
+        cls.pICache[counts] = root
+        return root
+
+
+    def aaComposition (self) :
+        ''' Returns the count of each amino acid in a input sequence. Ignores any invalid amino acid letters and white spaces when counting. These
+        numbers are later used to find the percentage/abundance of each in the input sequence. 
+
+        Example:
+            input: VLSPADKTNVKAAW
+            output: {"A" : 3, "C" : 0, "D" : 1, "E" : 0, "F" : 0, "G" : 0, "H" : 0, "I" : 0, "L" : 1, "K" : 2, 
+                        "M" : 0, "N" : 1, "P" : 1, "Q" : 0, "R" : 0, "S" : 1, "T" : 1, "V" : 2, "Y" : 0, "W" : 1}
+
+        '''
+        # returns the aa_dict made from the counts of __init__
+        return self.aa_dict
+
+    def _charge_ (self, pH):
+        ''' Calculates the net charge on the inputted protein at a specific pH. I used the function given above and implemented the math in Python
+        coding language, on the 7 ionizable counts with the 10 ** pKa values computed once in the class. '''
+        return self.chargeSlope(self.ionizableCounts(), pH)[0]
+
+    def charge_curve (self, ph_grid):
+        ''' The titration curve: net charge at every pH of ph_grid (a number, list or numpy array of any shape) with one numpy broadcast
+        instead of a _charge_ call per pH. Returns an array shaped like ph_grid. ProteinBatch.charge_curve does the same for many proteins.
+
+        Example:
+            input: VLSPADKTNVKAAW, [2, 7, 12]
+            output: array([ 2.67,  1.  , -1.93]) (rounded)
+        '''
+        return ProteinBatch.chargeMatrix(np.array([self.ionizableCounts()]), ph_grid)[0]
+
+    # assigned Cystine == True because the code will otherwise produce a "missing 1 required positional argument" error
+    def molarExtinction (self, Cystine = True):
+        ''' This method finds the extinction coefficient which indicates how much light a protein absorbs at a certain wavelength. I use the 
+        dictionary aa2abs280= {'Y':1490, 'W': 5500, 'C': 125} and formula given above to do so. I find the E_Y, E_W, and E_C by accessing their
+        values in the dictionary aa2abs280. I find the N_Y, N_W, and N_C by accessign their values/counts in the self.counts array. I then 
+        plug in their respective values in the formula (N_Y * E_Y) + (N_W * E_W) + (N_C * E_C). 
+        
+        Example:
+            input: VLSPADKTNVKAAW
+            output: 5500.00
+        '''
+
+        # find E_Y, E_W, and E_C by accessign their values in the dictionary aa2abs280
+        E_Y = self.aa2abs280["Y"]
+        E_W = self.aa2abs280["W"]
+        # checks if Cystine is True/present, if it is get it's E_C value from the dictionary. if it's False/not present, set it to 0 so it doesn't have an effect
+        if Cystine == True:
+            E_C = self.aa2abs280["C"]
+        else:
+            E_C = 0
+
+        # find the N_Y, N_W, and N_C by accessign their values/counts in the self.counts array made in __init__
+        N_Y = self.counts[ProteinParam.aaIndex["Y"]]
+        N_W = self.counts[ProteinParam.aaIndex["W"]]
+        # checks if Cystine is True/present, if it is get it's N_C value from the array. if it's False/not present, set it to 0 so it doesn't have an effect
+        if Cystine == True:
+            N_C = self.counts[ProteinParam.aaIndex["C"]]
+        else:
+            N_C = 0
+
+        # plug in calculated values in formula below. return the result
+        molar = (N_Y * E_Y) + (N_W * E_W) + (N_C * E_C)
+        return molar     
+
+    # assigned Cystine == True because the code will otherwise produce a "missing 1 required positional argument" error
+    def massExtinction (self, Cystine = True):
+        ''' Calculate the Mass Extinction by taking the Molar Extinction coefficient and dividing by the molecularWeight of the corresponding protein.
+
+        Example:
+            input: VLSPADKTNVKAAW
+            output: 3.67
+        '''
+        # calls the self.molecularWeight() to get the calculated molecular weight and store it into myMW
+        myMW =  self.molecularWeight()
+        # calls self.molarExtinction(), but checks if Cystine is True or False and takes that into consideration of the calculation
+        return self.molarExtinction(Cystine) / myMW if myMW else 0.0
+
+    def molecularWeight (self):
+        '''
+        This method calculates the molecular weight (MW) of the protein sequence. This is done by summing the weights of the individual amino acids 
+        and excluding the waters that are released with peptide bond formation. I access my self.counts to get the count of each amino acid as well as
+        the self.aa2mw to get the molecular weight of each amino acid. I also access the self.mwH2O to subtract the waters that are released with peptide
+        bond formation. The weight is kept after the first call, and a protein without valid amino acids weighs 0.
+
+        Example:
+            input: VLSPADKTNVKAAW
+            output: 1499.7
+        '''
+        if self._weight is not None:
+            return self._weight
+        # initialize a weight varaible to 0
+        weight = 0
+        # loop through the amino acids and their counts, in aa_dict order so the sum rounds the same way as always
+        for i, count in zip(ProteinParam.aaOrder, self.counts):
+            # apply the formula given in the directions above. multiply the moelcular weight of the amino acid to its count
+            # sum every iteration together
+            weight += self.aa2mw[i] * count
+
+        # find the number of peptide bonds in the protein sequence. this will just be the count-1
+        total = self.aaCount()
+        if total == 0:
+            self._weight = 0.0
+            return self._weight
+        num_pb = total - 1
+
+        # subtract the waters that are released with each peptide bond by multiplying 
+        num_pb *= self.mwH2O
+        self._weight = weight - num_pb
+        return self._weight
+
+
+class ProteinBatch :
+    ''' ProteinParam for many proteins at once. The amino acid counts of all proteins are one (N x 20) numpy matrix, with the columns in
+    aa_dict order, and every method returns one value per protein:
+        molarExtinction is a matrix product of the counts with the aa2abs280 values
+        molecularWeight adds the aa2mw weights of every column to all proteins at once
+        pI solves the zero charge pH of every distinct ionizable count row with vectorized Newton steps, like ProteinParam.pI
+    Results match ProteinParam to the printed precision. A protein without valid amino acids gets a molecular weight of 0.
+
+    Example:
+        batch = ProteinBatch(['VLSPADKTNVKAAW', 'MKWVTF'])
+        batch.molecularWeight() -> array([1499.71..., ...])
+    '''
+    # the amino acids in the order of ProteinParam.aa_dict, which are the columns of the count matrix
+    aaOrder = ProteinParam.aaOrder
+    # byte -> column of its amino acid, 20 for anything else. built on first use
+    aaColumns = None
+
+    def __init__ (self, proteins, names=None):
+        ''' proteins is an iterable of protein str or bytes, names optional names for them (like FastA headers). '''
+        if ProteinBatch.aaColumns is None:
+            columns = np.full(256, 20, dtype=np.int64)
+            for column, aa in enumerate(ProteinBatch.aaOrder):
+                columns[ord(aa)] = column
+            ProteinBatch.aaColumns = columns
+        # upper case every protein like ProteinParam does, then count all of them with one bincount over (protein, column) pairs
+        proteins = [protein.upper() if isinstance(protein, (bytes, bytearray)) else protein.upper().encode('ascii', 'replace') for protein in proteins]
+        self.names = names
+        lengths = np.fromiter((len(protein) for protein in proteins), dtype=np.int64, count=len(proteins))
+        columns = ProteinBatch.aaColumns[np.frombuffer(b''.join(proteins), dtype=np.uint8)]
+        rows = np.repeat(np.arange(len(proteins)), lengths)
+        self.counts = np.bincount(rows * 21 + columns, minlength=len(proteins) * 21).reshape(-1, 21)[:, :20]
+
+    @classmethod
+    def fromFasta (cls, fileName=None):
+        ''' Read every protein of a FastA file (stdin when fileName is None), named by their headers. '''
+        names, proteins = [], []
+        for header, protein in FastAreader(fileName).readFasta():
+            names.append(header)
+            proteins.append(protein)
+        return cls(proteins, names)
+
+    def __len__ (self):
+        return len(self.counts)
+
+    def aaCount (self):
+        ''' The number of valid amino acids of every protein. '''
+        return self.counts.sum(axis=1)
+
+    def aaComposition (self):
+        ''' The (N x 20) amino acid count matrix, columns in aaOrder. '''
+        return self.counts
+
+    def molecularWeight (self):
+        ''' Sum of the amino acid weights minus the water released by every peptide bond. The weights are added one column at a time
+        in aa_dict order, like ProteinParam.molecularWeight, because a different order can change the last digit of weights that end in 5. '''
+        weight = np.zeros(len(self.counts))
+        for column, aa in enumerate(ProteinBatch.aaOrder):
+            weight += ProteinParam.aa2mw[aa] * self.counts[:, column]
+        count = self.aaCount()
+        return np.where(count > 0, weight - (count - 1) * ProteinParam.mwH2O, 0.0)
 
-        yield header,sequence
+    def molarExtinction (self, Cystine=True):
+        ''' Absorbance at 280 nm from the tyrosine, tryptophan and (with Cystine) cysteine counts. '''
+        absorbance = np.array([ProteinParam.aa2abs280.get(aa, 0) if Cystine or aa != 'C' else 0 for aa in ProteinBatch.aaOrder])
+        return self.counts @ absorbance
+
+    def massExtinction (self, Cystine=True):
+        ''' Molar extinction divided by the molecular weight, 0 for a protein without weight. '''
+        weight = self.molecularWeight()
+        return np.divide(self.molarExtinction(Cystine), weight, out=np.zeros(len(weight)), where=weight != 0)
+
+    def ionizableCounts (self):
+        ''' The (N x 7) counts of the ionizable amino acids, columns in the order of ProteinParam.ionizable. '''
+        return self.counts[:, [ProteinBatch.aaOrder.index(aa) for aa in ProteinParam.ionizable]]
+
+    @staticmethod
+    def chargeSlope (counts, pH):
+        ''' ProteinParam.chargeSlope for the rows of an (N x 7) ionizable count matrix, at one pH per row. '''
+        H = 10.0 ** pH
+        nterm, cterm = ProteinParam.ntermPower, ProteinParam.ctermPower
+        charge = nterm / (nterm + H) - H / (cterm + H)
+        slope = nterm / (nterm + H) ** 2 + cterm / (cterm + H) ** 2
+        positive = len(ProteinParam.posPowers)
+        for column, power in enumerate(ProteinParam.posPowers + ProteinParam.negPowers):
+            if column < positive:
+                charge = charge + counts[:, column] * power / (power + H)
+            else:
+                charge = charge - counts[:, column] * H / (power + H)
+            slope = slope + counts[:, column] * power / (power + H) ** 2
+        return charge, -2.302585092994046 * H * slope
+
+    @staticmethod
+    def chargeMatrix (counts, ph_grid):
+        ''' Net charge of every row of an (N x 7) ionizable count matrix at every pH of ph_grid, an (N x grid shape) array.
+        Every ionizable group adds one broadcast (N x 1) * (grid) term, so no python loop runs over the proteins or the pH values. '''
+        H = 10.0 ** np.asarray(ph_grid, dtype=float)
+        counts = np.asarray(counts).reshape(len(counts), 7, *([1] * H.ndim))
+        nterm, cterm = ProteinParam.ntermPower, ProteinParam.ctermPower
+        charge = np.broadcast_to(nterm / (nterm + H) - H / (cterm + H), (len(counts),) + H.shape).copy()
+        positive = len(ProteinParam.posPowers)
+        for column, power in enumerate(ProteinParam.posPowers + ProteinParam.negPowers):
+            if column < positive:
+                charge += counts[:, column] * (power / (power + H))
+            else:
+                charge -= counts[:, column] * (H / (power + H))
+        return charge
+
+    def charge_curve (self, ph_grid):
+        ''' The titration curves of all proteins: an (N x len(ph_grid)) matrix of net charges, row i for protein i. '''
+        return self.chargeMatrix(self.ionizableCounts(), ph_grid)
+
+    def _charge_ (self, pH):
+        ''' Net charge of every protein at pH, a number or one pH per protein. '''
+        return self.chargeSlope(self.ionizableCounts(), np.broadcast_to(np.asarray(pH, dtype=float), (len(self.counts),)))[0]
+
+    @classmethod
+    def solveCharge (cls, counts):
+        ''' ProteinParam.solveCharge for every row of an (N x 7) ionizable count matrix at once, inf where the charge has no zero in 0-14. '''
+        rows = len(counts)
+        outside = (cls.chargeSlope(counts, np.zeros(rows))[0] < 0) | (cls.chargeSlope(counts, np.full(rows, 14.0))[0] > 0)
+        low, high, root = np.zeros(rows), np.full(rows, 14.0), np.full(rows, 7.0)
+        active = ~outside
+        for step in range(200):
+            if not active.any():
+                break
+            charge, slope = cls.chargeSlope(counts[active], root[active])
+            low[active] = np.where(charge >= 0, root[active], low[active])
+            high[active] = np.where(charge <= 0, root[active], high[active])
+            newton = root[active] - charge / slope
+            last = root[active]
+            # a Newton step below the float resolution of the pH ends the search of that row
+            done = (charge == 0) | (np.abs(newton - last) < 1e-13) | (high[active] - low[active] < 1e-13)
+            inside = (newton > low[active]) & (newton < high[active])
+            within = (newton >= low[active]) & (newton <= high[active])
+            root[active] = np.where(done, np.where(within & (charge != 0), newton, last), np.where(inside, newton, (low[active] + high[active]) / 2))
+            active[active] = ~done
+        return np.where(outside, np.inf, root)
+
+    def pI (self, precision=2):
+        ''' ProteinParam.pI for every protein: the zero charge pH of every distinct ionizable count row is solved once, then the binary
+        search of ProteinParam.bisectTo is replayed for all proteins together. '''
+        counts, inverse = np.unique(self.ionizableCounts(), axis=0, return_inverse=True)
+        root = self.solveCharge(counts)[inverse.reshape(-1)]
+        low = np.zeros(len(root))
+        high = np.full(len(root), 14.0)
+        prec = 10 ** (-precision)
+        result = np.zeros(len(root))
+        active = high - low > prec
+        while active.any():
+            middle = (low + high) / 2
+            # the charge is exactly zero in the middle
+            zero = active & (middle == root)
+            result[zero] = middle[zero]
+            low = np.where(active & (middle < root), middle, low)
+            high = np.where(active & (middle > root), middle, high)
+            finished = active & ~zero & (high - low <= prec)
+            result[finished] = ((high + low) / 2)[finished]
+            active &= ~(zero | finished)
+        # python round, exactly like ProteinParam
+        return np.array([round(value, precision) for value in result.tolist()])
+
+class Sequence :
+    ''' One sequence record, held once as bytes, with the encodings the engines use built on first use and then kept:
+        codes(): numpy base codes, A C G T = 0-3, a c g t, U and u = 4-7, anything else 8
+        reverseComplement(): the reverse complement bytes, from one bytes.translate
+        rna(): the uppercase RNA spelling used by the plain python NucParams
+        codonIndex(strand, strict): the codon index 16*a + 4*b + c of the codon at every position, on either strand
+    OrfFinder, NucParams and the ORF translation all take a Sequence, so a genome is encoded once however many of them read it.
+    '''
+    # tables that complement the upper case bases and turn a sequence into upper case RNA
+    compTrans = bytes.maketrans(b"ATGC", b"TACG")
+    rnaTrans = bytes.maketrans(b'acgtuT', b'ACGUUU')
+    # byte -> base code, built on first use. codes 4-7 are the bases only the lenient (NucParams) reading accepts
+    baseCodes = None
+
+    def __init__ (self, seq):
+        self.data = seq.encode('ascii', 'replace') if isinstance(seq, str) else bytes(seq)
+        self.cache = {}
+
+    def __len__ (self):
+        return len(self.data)
+
+    def __getitem__ (self, key):
+        return self.data[key]
+
+    def __bytes__ (self):
+        return self.data
+
+    def codes (self):
+        ''' The base code array of the sequence. '''
+        if 'codes' not in self.cache:
+            if Sequence.baseCodes is None:
+                table = np.full(256, 8, dtype=np.uint8)
+                for code, bases in enumerate(('A', 'C', 'G', 'T', 'a', 'c', 'g', 'tUu')):
+                    for base in bases:
+                        table[ord(base)] = code
+                Sequence.baseCodes = table
+            self.cache['codes'] = Sequence.baseCodes[np.frombuffer(self.data, dtype=np.uint8)]
+        return self.cache['codes']
+
+    def reverseComplement (self):
+        ''' The reverse complement, upper case bases only, like OrfFinder.reverseComp. '''
+        if 'reverse' not in self.cache:
+            self.cache['reverse'] = self.data[::-1].translate(Sequence.compTrans)
+        return self.cache['reverse']
+
+    def rna (self):
+        ''' The sequence in upper case with T turned into U. '''
+        if 'rna' not in self.cache:
+            self.cache['rna'] = self.data.translate(Sequence.rnaTrans)
+        return self.cache['rna']
+
+    def codonIndex (self, strand='+', strict=False):
+        ''' The codon index of every position 0 .. len - 3. strand '-' gives the index of the reverse complement codon at each top strand position.
+        strict only reads upper case A, C, G and T (like OrfFinder), otherwise case is ignored and U counts as T (like NucParams).
+        A codon with any other base gets an index past 63. Take [frame::3] for the codons of one frame. '''
+        key = ('index', strand, strict)
+        if key not in self.cache:
+            codes = self.codes()
+            bases = np.where(codes < (4 if strict else 8), codes & 3, 64).astype(np.uint16)
+            if len(bases) < 3:
+                index = np.zeros(0, dtype=np.uint16)
+            elif strand == '+':
+                index = 16 * bases[:-2] + 4 * bases[1:-1] + bases[2:]
+            else:
+                # the complement of code x is 3 - x, and the reverse complement reads the bases backwards
+                comp = np.where(bases < 4, 3 - bases, 64)
+                index = 16 * comp[2:] + 4 * comp[1:-1] + comp[:-2]
+            self.cache[key] = index
+        return self.cache[key]
+
+class NucParams:
+    rnaCodonTable = {
+    # RNA codon table
+    # U
+    'UUU': 'F', 'UCU': 'S', 'UAU': 'Y', 'UGU': 'C',  # UxU
+    'UUC': 'F', 'UCC': 'S', 'UAC': 'Y', 'UGC': 'C',  # UxC
+    'UUA': 'L', 'UCA': 'S', 'UAA': '-', 'UGA': '-',  # UxA
+    'UUG': 'L', 'UCG': 'S', 'UAG': '-', 'UGG': 'W',  # UxG
+    # C
+    'CUU': 'L', 'CCU': 'P', 'CAU': 'H', 'CGU': 'R',  # CxU
+    'CUC': 'L', 'CCC': 'P', 'CAC': 'H', 'CGC': 'R',  # CxC
+    'CUA': 'L', 'CCA': 'P', 'CAA': 'Q', 'CGA': 'R',  # CxA
+    'CUG': 'L', 'CCG': 'P', 'CAG': 'Q', 'CGG': 'R',  # CxG
+    # A
+    'AUU': 'I', 'ACU': 'T', 'AAU': 'N', 'AGU': 'S',  # AxU
+    'AUC': 'I', 'ACC': 'T', 'AAC': 'N', 'AGC': 'S',  # AxC
+    'AUA': 'I', 'ACA': 'T', 'AAA': 'K', 'AGA': 'R',  # AxA
+    'AUG': 'M', 'ACG': 'T', 'AAG': 'K', 'AGG': 'R',  # AxG
+    # G
+    'GUU': 'V', 'GCU': 'A', 'GAU': 'D', 'GGU': 'G',  # GxU
+    'GUC': 'V', 'GCC': 'A', 'GAC': 'D', 'GGC': 'G',  # GxC
+    'GUA': 'V', 'GCA': 'A', 'GAA': 'E', 'GGA': 'G',  # GxA
+    'GUG': 'V', 'GCG': 'A', 'GAG': 'E', 'GGG': 'G'  # GxG
+    }
+    dnaCodonTable = {key.replace('U','T'):value for key, value in rnaCodonTable.items()}
+    # tables used by addSequence to uppercase a sequence and turn T into U in a single translate call
+    rnaTrans = str.maketrans('acgtuT', 'ACGUUU')
+    rnaBytesTrans = bytes.maketrans(b'acgtuT', b'ACGUUU')
+    # maps the str and the bytes spelling of every codon to its key in rnaCodonTable
+    rnaCodonKeys = {**{key: key for key in rnaCodonTable}, **{key.encode(): key for key in rnaCodonTable}}
+    # addSequence uses the numpy engine whenever numpy is installed. set to False to count in plain python
+    useNumpy = np is not None
+    # lookup tables of the numpy engine, built by _numpyTables the first time they are needed
+    baseCodes = None
+
+    def __init__ (self, inString=''):
+        ''' Create empty dictionaries for the allowed nucleotides, codon keys (3-base), and codon values (1-letter). '''
+        # initialize dictionary for allowed nucleotides. assign the values 0 to them as we will edit that value later on
+        self.nucComp = {"A": 0, "C": 0, "G": 0, "T": 0, "U": 0, "N": 0}
+
+        # add the rnaCodonTable values to an empty dictionary and assign the value 0 to them
+        self.codonComp = {}
+        for i in NucParams.rnaCodonTable.keys():
+            self.codonComp[i] = 0
+
+        # add the rnaCodonTable keys to an empty dictionary and assign the value 0 to them
+        self.aaComp = {}
+        for i in NucParams.rnaCodonTable.values():
+            self.aaComp[i] = 0
+
+        # bases after the last whole codon of the chunk given to feed, put in front of the next chunk
+        self.carry = None
+
+    @classmethod
+    def _numpyTables (cls):
+        ''' Build the lookup tables of the numpy engine: a byte -> base code table, the codon names in code order and the 64 -> 21 codon to amino acid matrix. '''
+        # A, C, G and U/T (either case) get the codes 0-3. every other byte gets 64, which pushes any codon holding it past index 63
+        baseCodes = np.full(256, 64, dtype=np.uint16)
+        for code, bases in enumerate(('Aa', 'Cc', 'Gg', 'UuTt')):
+            for base in bases:
+                baseCodes[ord(base)] = code
+        # codon index 16*first + 4*second + third names the codons in this order
+        cls.codonOrder = [a + b + c for a in 'ACGU' for b in 'ACGU' for c in 'ACGU']
+        cls.aaOrder = list(dict.fromkeys(cls.rnaCodonTable.values()))
+        cls.codonToAa = np.zeros((64, len(cls.aaOrder)), dtype=np.int64)
+        for index, codon in enumerate(cls.codonOrder):
+            cls.codonToAa[index, cls.aaOrder.index(cls.rnaCodonTable[codon])] = 1
+        cls.baseCodes = baseCodes
+
+    def _addSequenceNumpy (self, inSeq):
+        ''' numpy engine for addSequence: byte counts from one bincount, codon counts from a vectorized 16*a + 4*b + c index, amino acids from a matrix product. '''
+        if NucParams.baseCodes is None:
+            NucParams._numpyTables()
+        # a str is turned into bytes, any non ascii character becomes '?' so the positions stay the same
+        if isinstance(inSeq, str):
+            inSeq = inSeq.encode('ascii', 'replace')
+        raw = np.frombuffer(inSeq.data if isinstance(inSeq, Sequence) else inSeq, dtype=np.uint8)
+
+        # the nucleotides are counted case sensitive, exactly like the dictionary lookups of the python path
+        byteCounts = np.bincount(raw, minlength=256)
+        for nuc in self.nucComp:
+            self.nucComp[nuc] += int(byteCounts[ord(nuc)])
+
+        if isinstance(inSeq, Sequence):
+            # the whole codons are every third codon of the cached index
+            index = inSeq.codonIndex()[0::3]
+        else:
+            # ignore the incomplete/lagging codon at the end and give every whole codon its index
+            codes = NucParams.baseCodes[raw[:len(raw) // 3 * 3]].reshape(-1, 3)
+            index = 16 * codes[:, 0] + 4 * codes[:, 1] + codes[:, 2]
+        # indexes past 63 hold a base that is not A, C, G or U (like N) and are dropped
+        codonCounts = np.bincount(index, minlength=64)[:64]
+        aaCounts = codonCounts @ NucParams.codonToAa
+
+        for codon, count in zip(NucParams.codonOrder, codonCounts.tolist()):
+            self.codonComp[codon] += count
+        for aa, count in zip(NucParams.aaOrder, aaCounts.tolist()):
+            self.aaComp[aa] += count
+
+    def addSequence (self, inSeq):
+        ''' Find the counts of inSeq nucleotide bases, codons, and codons' AA composition. inSeq can be a str, the bytes given by FastAreader(asBytes=True) or a Sequence. '''
+        if NucParams.useNumpy:
+            return self._addSequenceNumpy(inSeq)
+        if isinstance(inSeq, Sequence):
+            # the counts are taken from the bytes, the codons from the cached RNA spelling
+            rna = inSeq.rna()
+            inSeq = inSeq.data
+        else:
+            rna = None
+
+        # bytes and str need their own keys and tables, pick the matching ones once
+        isBytes = isinstance(inSeq, (bytes, bytearray))
+
+        # count every allowed nucleotide with one C level scan of inSeq instead of a python loop over every base
+        for nuc in self.nucComp:
+            self.nucComp[nuc] += inSeq.count(nuc.encode() if isBytes else nuc)
+
+        # we are looking at a RNA sequence so all T's need to be replaced by U's
+        # turning all lower case letters into upper case to cross-match with the rnaCodonTable above. translate does both in one copy
+        inSeq = rna if rna is not None else inSeq.translate(NucParams.rnaBytesTrans if isBytes else NucParams.rnaTrans)
+
+        # ignore incomplete/lagging codon sequences in the end of the sequence. i will increment in counts of 3 after each iteration
+        # count how often every 3-base slice appears, then add the counts to the codon and amino acid dictionaries once per distinct codon
+        codonCounts = Counter(inSeq[i:i+3] for i in range(0, len(inSeq), 3))
+        for codon, count in codonCounts.items():
+            # the codon might not be in rnaCodonTable (for example it contains an N or is the lagging end), those are ignored
+            codon = NucParams.rnaCodonKeys.get(codon)
+            if codon:
+                self.codonComp[codon] += count
+                self.aaComp[NucParams.rnaCodonTable[codon]] += count
+
+    def feed (self, chunk):
+        ''' Add the next piece of a sequence that is read in chunks. The bases after the last whole codon are carried over to the next chunk,
+        so the codons are framed exactly as if addSequence was given the whole sequence. Call finish at the end of every sequence. '''
+        if self.carry:
+            chunk = self.carry + chunk
+        # only whole codons are counted now
+        cut = len(chunk) // 3 * 3
+        self.addSequence(chunk[:cut])
+        self.carry = chunk[cut:]
+
+    def finish (self):
+        ''' End the sequence given to feed. The 1 or 2 lagging bases still count as nucleotides, but not as a codon. '''
+        carry, self.carry = self.carry, None
+        if carry:
+            self.addSequence(carry)
+
+    def merge (self, other):
+        ''' Add the counts of another NucParams to this one, for example the partial counts of a worker process. Returns self. '''
+        for comp, otherComp in ((self.nucComp, other.nucComp), (self.codonComp, other.codonComp), (self.aaComp, other.aaComp)):
+            for key, count in otherComp.items():
+                comp[key] = comp.get(key, 0) + count
+        return self
+
+    def __add__ (self, other):
+        ''' Return a new NucParams holding the counts of both. '''
+        return NucParams().merge(self).merge(other)
+
+    def toDict (self):
+        ''' Return the counts as plain dictionaries, ready for json. '''
+        return {'nucComp': self.nucComp, 'codonComp': self.codonComp, 'aaComp': self.aaComp}
+
+    @classmethod
+    def fromDict (cls, counts):
+        ''' Make a NucParams holding the counts written by toDict. '''
+        nuc = cls()
+        nuc.nucComp.update(counts['nucComp'])
+        nuc.codonComp.update(counts['codonComp'])
+        nuc.aaComp.update(counts['aaComp'])
+        return nuc
+
+    def aaComposition(self):
+        ''' Returns the calculated AA composition from above. '''
+        return self.aaComp
+    def nucComposition(self):
+        ''' Returns the calculated nucleotide composition from above. '''
+        return self.nucComp
+    def codonComposition(self):
+        ''' Returns the calculated codon composition from above. '''
+        return self.codonComp
+    def nucCount(self):
+        ''' Returns the sum of the count (values) of all valid nucleotides in inSeq. '''
+        return sum(self.nucComp.values())
+        
+
+import heapq
+class LongestOrfs :
+    ''' ORF store for the longest gene selection (-lG and --top): only the longest ORF of every stop codon is kept.
+    It takes append and extend like the ORF list, so every scanner fills it the same way, but it holds one tuple per stop codon
+    instead of every start that ends there. Iterating gives the top strand ORFs, then the bottom strand ones, like the ORF list. '''
+    def __init__(self):
+        # stop codon position -> longest ORF ending there, per strand. a top strand ORF ends at its stop position, a bottom strand one at its start
+        self.forward = {}
+        self.reverse = {}
+
+    def append(self, orf):
+        if orf[0].startswith('+'):
+            table, key = self.forward, orf[2]
+        else:
+            table, key = self.reverse, orf[1]
+        kept = table.get(key)
+        if kept is None or orf[3] > kept[3]:
+            table[key] = orf
+
+    def extend(self, orfs):
+        for orf in orfs:
+            self.append(orf)
+
+    def __iter__(self):
+        yield from self.forward.values()
+        yield from self.reverse.values()
+
+    def __len__(self):
+        return len(self.forward) + len(self.reverse)
 
 class OrfFinder:        
     ''' Calculates the ORF of DNA sequences by finding the start and stop codons.
@@ -96,82 +1292,368 @@ class OrfFinder:
     Input: .fa file that contiains DNA sequence
     Output: Coding frame (+ for top strand and - for bottom strand). Length of ORF. 
     '''
+    # ORF_find uses the numpy codon index (ORF_findIndexed) whenever numpy is installed. set to False to scan in plain python
+    useNumpy = np is not None
+
+    # codon classes in the codon class table
+    NONE, START, STOP = 0, 1, 2
 
     # initialize needed components of the code
     # initialize start codons, stop codons, minimum ORF length (100 nucleotides), and an empty ORF list which will store the found ORFs
-    def __init__(self, seq, start = None, stop = None, minORF = 100):
+    # start and stop can be any codon lists, for example ['ATG', 'GTG', 'TTG'] starts for archaeal genomes. None keeps the standard code
+    # longest keeps only the longest ORF of every stop codon while scanning, top keeps only the top longest ones in ORF_final (and implies longest)
+    def __init__(self, seq, start = None, stop = None, minORF = 100, longest = False, top = None):
         self.seq = seq
-        self.start = ["ATG"]
-        self.stop = ["TAA","TGA","TAG"]
+        self.start = self.cleanCodons(["ATG"] if start is None else start)
+        self.stop = self.cleanCodons(["TAA","TGA","TAG"] if stop is None else stop)
         self.minORF = minORF
-        self.ORF = []
+        if top is not None and top < 1:
+            raise ValueError('top is the number of longest ORFs to keep, it must be at least 1, not {}'.format(top))
+        self.longest = bool(longest or top)
+        self.top = top
+        self.ORF = LongestOrfs() if self.longest else []
+        # bases given to feed so far, None until the streaming mode is used
+        self.streamLength = None
+        # compile the codon lists into one table, so matching costs the same however many codons are configured
+        self.codonClass = self.compileCodons(self.start, self.stop)
+
+    @staticmethod
+    def cleanCodons(codons):
+        ''' Turn a codon list from the command line into clean uppercase DNA codons. Leaves out None (an empty -s/-t), splits 'GTG,TTG' and turns U into T. '''
+        clean = []
+        for codon in codons:
+            if codon is None:
+                continue
+            codon = codon.decode() if isinstance(codon, (bytes, bytearray)) else codon
+            for part in codon.split(','):
+                part = part.strip().upper().replace('U', 'T')
+                if len(part) != 3 or part.strip('ACGT'):
+                    raise ValueError('{} is not a codon, codons are 3 of the bases A, C, G and T'.format(part))
+                if part not in clean:
+                    clean.append(part)
+        return clean
+
+    @classmethod
+    def compileCodons(cls, start, stop):
+        ''' Build the 64 entry codon class table: entry 16*a + 4*b + c (A=0, C=1, G=2, T=3) is START, STOP or NONE.
+        A codon in both lists counts as a start, like the elif in scanStrand. '''
+        codonClass = bytearray(64)
+        for kind, codons in ((cls.STOP, stop), (cls.START, start)):
+            for codon in codons:
+                codonClass[16 * 'ACGT'.index(codon[0]) + 4 * 'ACGT'.index(codon[1]) + 'ACGT'.index(codon[2])] = kind
+        return codonClass
+
+    def codonMatcher(self, asBytes, codonClass = None):
+        ''' Dictionary from every codon with a class to its class, spelled as str or as bytes to match the sequence. Used by scanStrand.
+        codonClass can give another table, like the bottom strand one from reverseClass. '''
+        matcher = {}
+        for index, kind in enumerate(self.codonClass if codonClass is None else codonClass):
+            if kind:
+                codon = 'ACGT'[index // 16] + 'ACGT'[index // 4 % 4] + 'ACGT'[index % 4]
+                matcher[codon.encode() if asBytes else codon] = kind
+        return matcher
+
+    # tables that complement every base, used by reverseComp for str and bytes sequences
+    compTrans = str.maketrans("ATGC", "TACG")
+    compBytesTrans = bytes.maketrans(b"ATGC", b"TACG")
 
     # finding the reverse complement of the sequence -- this is needed when finding negative frames since DNA is double stranded
     def reverseComp(self):
-        # a dictionary that holds the complements of all bases
-        comp = {"A":"T", "T":"A", "G":"C", "C":"G"}
-        # store the reverse complement in an empty list and join them together so they create the 3'-5' bottom of double strand
-        reverse_comp = []
-        for i in reversed(self.seq):
-            reverse_comp.append(comp[i])
+        # a Sequence keeps its reverse complement, so it is only made once
+        if isinstance(self.seq, Sequence):
+            return self.seq.reverseComplement()
+        # reverse the sequence with a slice and complement all bases in one translate call so they create the 3'-5' bottom of double strand
+        table = self.compBytesTrans if isinstance(self.seq, (bytes, bytearray)) else self.compTrans
         # return the reverse of the strand
-        return "".join(reverse_comp)
+        return self.seq[::-1].translate(table)
 
-    def ORF_find(self):
-        # initializes list to keep track of the start codon positions for every reading frame
-        lst = [[0], [0], [0]]
+    def scanStrand(self, seq, strand):
+        ''' Find the ORFs of one strand in a single pass. strand is '+' for the sequence itself or '-' for its reverse complement,
+        which decides how positions are turned into top strand coordinates. Every strand starts with its own empty state. '''
+        # one dictionary lookup per position gives the class of the codon there
+        matcher = self.codonMatcher(isinstance(seq, (bytes, bytearray)))
+        START, STOP = OrfFinder.START, OrfFinder.STOP
+        seqLength = len(self.seq)
+        # open start codon positions for every reading frame, in increasing order. position 0 counts as a start in every frame,
+        # so a gene that runs in from the beginning of the sequence is found too
+        openStarts = [[0], [0], [0]]
 
         # loops and looks through the sequence for every 3 codons
-        for i in range(0, len(self.seq) - 2):
-            # gets 3 nucleotides, 1 codon
-            codon = self.seq[i:i+3]
-            # finds the reading frame, either 1, 2, or 3
-            frame = i % 3
-
-            # checks if the codon found is in the start codon list initialized ["ATG"]
-            # if it is ["ATG"], then store the index of the start codon and its frame
-            if codon in self.start: 
-                lst[frame].append(i)
-
-            # checks if the codon found is in the stop codon list initialized ["TAA","TGA","TAG"]
-            elif codon in self.stop:
-                # look through all the found start codons in the same frame
-                while lst[frame]:
-                    # get the first start codon recorded
-                    start = lst[frame].pop(0)
+        for i in range(0, len(seq) - 2):
+            # gets 3 nucleotides, 1 codon, and its class
+            kind = matcher.get(seq[i:i+3])
+
+            # checks if the codon found is a start codon, if it is then store the index of the start codon in its frame
+            if kind == START:
+                openStarts[i % 3].append(i)
+
+            # checks if the codon found is a stop codon
+            elif kind == STOP:
+                frame = i % 3
+                # every open start in the same frame ends at this stop. the earliest start gives the longest ORF,
+                # so the loop can stop at the first one that is shorter than minORF
+                for start in openStarts[frame]:
                     # calculate the ORF length
                     length = i + 3 - start
-                    # check that the length is greater than or equal to 100 nucleotides
-                    # if it is, store the ORF output requirements, like frame, start position, stop position, and length
-                    if length >= self.minORF:
+                    if length < self.minORF:
+                        break
+                    # store the ORF output requirements, like frame, start position, stop position, and length
+                    if strand == '+':
                         self.ORF.append((f'+{frame + 1}', start + 1, i + 3, length))
+                    else:
+                        self.ORF.append((f'-{frame + 1}', seqLength - (i + 3) + 1, seqLength - start, length))
+                    # the earliest start is the longest ORF of this stop, the only one the longest gene selection keeps
+                    if self.longest:
+                        break
+                # the frame has no open starts left after its stop codon
+                openStarts[frame].clear()
+
+    def _codonIndex(self, codes):
+        ''' Give every position of a base code array the index 16*a + 4*b + c of the codon that starts there. '''
+        return 16 * codes[:-2] + 4 * codes[1:-1] + codes[2:]
+
+    def _classTable(self):
+        ''' The codon class table stretched over every codon index. indexes past 63 hold a base that is not A, C, G or T and have no class. '''
+        table = np.zeros(16 * 64 + 4 * 64 + 64 + 1, dtype=np.uint8)
+        table[:64] = np.frombuffer(bytes(self.codonClass), dtype=np.uint8)
+        return table
+
+    def indexStrand(self, index, strand, classTable):
+        ''' Find the ORFs of one strand from the codon index of its positions without a python loop over the bases. Gives the same tuples, in the same order, as scanStrand. '''
+        seqLength = len(self.seq)
+        kinds = classTable[index]
+        startPos = np.flatnonzero(kinds == OrfFinder.START)
+        stopPos = np.flatnonzero(kinds == OrfFinder.STOP)
 
+        frames, starts, stops = [], [], []
+        for frame in range(3):
+            frameStops = stopPos[stopPos % 3 == frame]
+            # position 0 counts as a start in every frame, so a gene that runs in from the beginning of the sequence is found too
+            frameStarts = np.concatenate(([0], startPos[startPos % 3 == frame]))
+            # every start ends at the first stop of its frame at or after it. starts after the last stop never end
+            nextStop = np.searchsorted(frameStops, frameStarts)
+            ended = nextStop < len(frameStops)
+            frameStarts = frameStarts[ended]
+            frameEnds = frameStops[nextStop[ended]]
+            # minGene filtering is one vectorized comparison
+            long = frameEnds + 3 - frameStarts >= self.minORF
+            frames.append(np.full(long.sum(), frame))
+            starts.append(frameStarts[long])
+            stops.append(frameEnds[long])
+        frames, starts, stops = np.concatenate(frames), np.concatenate(starts), np.concatenate(stops)
+
+        # order by stop, then start, which is the order scanStrand finds them in
+        order = np.lexsort((starts, stops))
+        if self.longest:
+            # the first ORF of every stop has the earliest start, the only one the longest gene selection keeps
+            order = order[np.unique(stops[order], return_index=True)[1]]
+        for frame, start, i in zip(frames[order].tolist(), starts[order].tolist(), stops[order].tolist()):
+            length = i + 3 - start
+            if strand == '+':
+                self.ORF.append((f'+{frame + 1}', start + 1, i + 3, length))
+            else:
+                self.ORF.append((f'-{frame + 1}', seqLength - (i + 3) + 1, seqLength - start, length))
+
+    def ORF_findIndexed(self):
+        ''' Find the ORFs on both strands with numpy: the codon index of every position is taken from the Sequence (made here for a str or bytes)
+        and every start and stop codon is found at once. Only upper case A, C, G and T are read, like scanStrand. '''
+        seq = self.seq if isinstance(self.seq, Sequence) else Sequence(self.seq)
+        if len(seq) < 3:
+            return
+        classTable = self._classTable()
+        self.indexStrand(seq.codonIndex('+', strict=True), '+', classTable)
+        # the bottom strand index is kept in top strand positions, reversed it runs along the reverse complement
+        self.indexStrand(seq.codonIndex('-', strict=True)[::-1], '-', classTable)
+
+    def ORF_find(self):
+        ''' Find the ORFs on both strands: one pass over the sequence and one over its reverse complement. '''
+        if OrfFinder.useNumpy:
+            return self.ORF_findIndexed()
+        self.scanStrand(self.seq.data if isinstance(self.seq, Sequence) else self.seq, '+')
         # do the same as above, but now for the reverse sequence
-        reverseSeq = self.reverseComp()
-        # loops and looks through the sequence for every 3 codons
-        for i in range(0, len(reverseSeq) - 2):
-            # gets 3 nucleotides, 1 codon
-            codon = reverseSeq[i:i+3]
-            # finds the reading frame, either 1, 2, or 3
-            frame = i % 3
-            # checks if the codon found is in the start codon list initialized ["ATG"]
-            # if it is ["ATG"], then store the index of the start codon and its frame
-            if codon in self.start: 
-                lst[frame].append(i)
-            # checks if the codon found is in the stop codon list initialized ["TAA","TGA","TAG"]
-            elif codon in self.stop:
-                # look through all the found start codons in the same frame
-                while lst[frame]:
-                    # get the first start codon recorded
-                    start = lst[frame].pop(0)
-                    # calculate the ORF length
-                    length = i + 3 - start
-                    # check that the length is greater than or equal to 100 nucleotides
-                    # if it is, store the ORF output requirements, like frame, start position, stop position, and length
-                    if length >= self.minORF:
-                        self.ORF.append((f'-{frame + 1}', len(self.seq) - (i + 3) + 1, len(self.seq) - start, length))
+        self.scanStrand(self.reverseComp(), '-')
+
+    def reverseClass(self):
+        ''' Codon class table of the bottom strand, indexed by the top strand codon: entry 16*a + 4*b + c holds the class of its reverse complement. '''
+        reverse = bytearray(64)
+        for index in range(64):
+            a, b, c = index // 16, index // 4 % 4, index % 4
+            # the complement of code x is 3 - x, and the reverse complement reads the bases backwards
+            reverse[index] = self.codonClass[16 * (3 - c) + 4 * (3 - b) + (3 - a)]
+        return reverse
+
+    def startStream(self, offset = 0):
+        ''' Start the streaming mode, with the first chunk at position offset of the sequence. Called by feed, or by findWindow for a window. '''
+        self.streamLength = offset
+        self.tail = None
+        # open start positions per top strand frame. position 0 counts as a start in every frame, like in scanStrand
+        self.openStarts = [[0], [0], [0]] if offset == 0 else [[], [], []]
+        # position of the last bottom strand stop codon in every frame (by position % 3), -1 before the first one
+        self.lastRevStop = [-1, -1, -1]
+        # (stop position, start position) of the bottom strand ORFs, turned into tuples by finish once the length is known
+        self.revFound = []
+
+    def feed(self, chunk):
+        ''' Streaming mode: find the ORFs of the next piece of a sequence, so a whole chromosome never has to be in memory.
+        Only the open starts of every top strand frame, the last bottom strand stop of every frame and the last 2 bases are kept between chunks.
+        Bottom strand codons are matched on the top strand with the reverse complement class table, no reverse copy is made.
+        Call finish after the last chunk, self.ORF then holds the same tuples, in the same order, as ORF_find on the whole sequence. '''
+        if self.streamLength is None:
+            self.startStream()
+        data = chunk if self.tail is None else self.tail + chunk
+        # position of data[0] in the whole sequence
+        base = self.streamLength - (0 if self.tail is None else len(self.tail))
+        self.streamLength += len(chunk)
+        # the last 2 bases start codons that end in the next chunk
+        self.tail = data[-2:]
+        if OrfFinder.useNumpy:
+            self._feedIndexed(data, base)
+        else:
+            self._feedScan(data, base)
+
+    def _feedScan(self, data, base):
+        ''' Pure python streaming: one lookup per position gives the class of the codon on both strands. '''
+        forward = self.codonMatcher(isinstance(data, (bytes, bytearray)))
+        reverse = self.codonMatcher(isinstance(data, (bytes, bytearray)), self.reverseClass())
+        START, STOP = OrfFinder.START, OrfFinder.STOP
+
+        for i in range(0, len(data) - 2):
+            codon = data[i:i+3]
+            pos = base + i
+            frame = pos % 3
+            kind = forward.get(codon)
+            if kind == START:
+                self.openStarts[frame].append(pos)
+            elif kind == STOP:
+                for start in self.openStarts[frame]:
+                    length = pos + 3 - start
+                    if length < self.minORF:
+                        break
+                    self.ORF.append((f'+{frame + 1}', start + 1, pos + 3, length))
+                self.openStarts[frame] = []
+            # on the bottom strand a start ends at the nearest stop to its left in the same frame
+            kind = reverse.get(codon)
+            if kind == START:
+                stop = self.lastRevStop[frame]
+                if stop >= 0 and pos - stop + 3 >= self.minORF:
+                    self.revFound.append((stop, pos))
+            elif kind == STOP:
+                self.lastRevStop[frame] = pos
+
+    def _feedIndexed(self, data, base):
+        ''' numpy streaming: classify every codon of the chunk on both strands at once and pair starts with stops per frame with searchsorted. '''
+        data = data.encode('ascii', 'replace') if isinstance(data, str) else data
+        if len(data) < 3:
+            return
+        baseCodes = np.full(256, 64, dtype=np.uint16)
+        for code, letter in enumerate(b'ACGT'):
+            baseCodes[letter] = code
+        index = self._codonIndex(baseCodes[np.frombuffer(data, dtype=np.uint8)])
+        classTable = self._classTable()
+        forward = classTable[index]
+        reverseTable = np.zeros_like(classTable)
+        reverseTable[:64] = np.frombuffer(bytes(self.reverseClass()), dtype=np.uint8)
+        reverse = reverseTable[index]
+        START, STOP = OrfFinder.START, OrfFinder.STOP
+
+        startPos = np.flatnonzero(forward == START) + base
+        stopPos = np.flatnonzero(forward == STOP) + base
+        revStartPos = np.flatnonzero(reverse == START) + base
+        revStopPos = np.flatnonzero(reverse == STOP) + base
+
+        frames, starts, stops = [], [], []
+        for frame in range(3):
+            # top strand: the open starts of earlier chunks come first, every start ends at the next stop of its frame
+            frameStops = stopPos[stopPos % 3 == frame]
+            frameStarts = np.concatenate((np.array(self.openStarts[frame], dtype=np.int64), startPos[startPos % 3 == frame]))
+            nextStop = np.searchsorted(frameStops, frameStarts)
+            ended = nextStop < len(frameStops)
+            self.openStarts[frame] = frameStarts[~ended].tolist()
+            frameStarts = frameStarts[ended]
+            frameEnds = frameStops[nextStop[ended]]
+            long = frameEnds + 3 - frameStarts >= self.minORF
+            frames.append(np.full(long.sum(), frame))
+            starts.append(frameStarts[long])
+            stops.append(frameEnds[long])
+
+            # bottom strand: every start ends at the nearest stop to its left, which may be the last stop of an earlier chunk
+            revStops = revStopPos[revStopPos % 3 == frame]
+            revStarts = revStartPos[revStartPos % 3 == frame]
+            previous = np.searchsorted(revStops, revStarts) - 1
+            revEnds = np.where(previous >= 0, revStops[np.maximum(previous, 0)] if len(revStops) else -1, self.lastRevStop[frame])
+            found = (revEnds >= 0) & (revStarts - revEnds + 3 >= self.minORF)
+            self.revFound.extend(zip(revEnds[found].tolist(), revStarts[found].tolist()))
+            if len(revStops):
+                self.lastRevStop[frame] = int(revStops[-1])
+
+        frames, starts, stops = np.concatenate(frames), np.concatenate(starts), np.concatenate(stops)
+        order = np.lexsort((starts, stops))
+        if self.longest:
+            order = order[np.unique(stops[order], return_index=True)[1]]
+        for frame, start, i in zip(frames[order].tolist(), starts[order].tolist(), stops[order].tolist()):
+            self.ORF.append((f'+{frame + 1}', start + 1, i + 3, i + 3 - start))
+
+    def finish(self):
+        ''' End the streamed sequence: add the bottom strand ORFs, which need the sequence length for their frame, in ORF_find order. '''
+        seqLength = self.streamLength or 0
+        revFound = self.revFound if self.streamLength is not None else []
+        # the start of the bottom strand counts as a start in every frame, it ends at the rightmost bottom strand stop of the frame
+        for stop in (self.lastRevStop if self.streamLength is not None else []):
+            if stop >= 0 and seqLength - stop >= self.minORF:
+                revFound.append((stop, seqLength - 3))
+        # the bottom strand is read from right to left, so its ORFs come by decreasing stop, then decreasing start
+        revFound.sort(reverse = True)
+        for stop, start in revFound:
+            # the frame counts from the right end of the sequence
+            self.ORF.append((f'-{(seqLength - 3 - stop) % 3 + 1}', stop + 1, start + 3, start - stop + 3))
+        self.streamLength = None
+
+    def safeStart(self, seq, pos):
+        ''' Where a window that begins at pos has to start reading: far enough back that every top strand frame and every bottom strand frame
+        has a stop codon before pos. The open starts and last stops at pos are then the same as when the whole sequence is read. '''
+        asBytes = isinstance(seq, (bytes, bytearray))
+        forward = self.codonMatcher(asBytes)
+        reverse = self.codonMatcher(asBytes, self.reverseClass())
+        forwardSeen, reverseSeen = set(), set()
+        for p in range(pos - 1, -1, -1):
+            codon = seq[p:p+3]
+            if forward.get(codon) == OrfFinder.STOP:
+                forwardSeen.add(p % 3)
+            if reverse.get(codon) == OrfFinder.STOP:
+                reverseSeen.add(p % 3)
+            if len(forwardSeen) == 3 and len(reverseSeen) == 3:
+                return p
+        return 0
+
+    def findWindow(self, seq, offset, begin, end):
+        ''' Find the ORFs of the window begin..end of a long sequence, from the piece seq that starts at position offset (from safeStart)
+        and reaches 2 bases past end. Returns the top strand tuples that end in the window, the bottom strand (stop, start) pairs that start
+        in it and the last bottom strand stop of every frame. joinWindows puts the windows of a sequence back together. '''
+        self.startStream(offset)
+        self.feed(seq)
+        forward = [orf for orf in self.ORF if begin <= orf[2] - 3 < end]
+        reverse = [pair for pair in self.revFound if begin <= pair[1] < end]
+        return forward, reverse, self.lastRevStop
+
+    def joinWindows(self, windows, seqLength):
+        ''' Put the findWindow results of consecutive windows together. self.ORF then holds the same tuples, in the same order, as ORF_find. '''
+        self.ORF = LongestOrfs() if self.longest else []
+        self.revFound = []
+        for forward, reverse, lastRevStop in windows:
+            self.ORF.extend(forward)
+            self.revFound.extend(reverse)
+        # the last window knows the last bottom strand stop of every frame
+        self.lastRevStop = lastRevStop
+        self.streamLength = seqLength
+        self.finish()
+
+    def ORF_select(self):
+        ''' The ORFs that ORF_final prints, in its order: longest first, one per stop codon (or only the top longest ones). '''
+        # the longest gene selection already holds one ORF per stop codon, only the ORFs that are kept get sorted
+        if self.longest:
+            order = lambda x: (-x[3], x[1])
+            return sorted(self.ORF, key = order) if self.top is None else heapq.nsmallest(self.top, self.ORF, key = order)
 
-    def ORF_final(self):
         # sort the found ORF's length in decreasing order, then start position
         # x[3] is the where the length is stored. the negative before x[3] sorts in descending
         # x[1] is where the start position is stored
@@ -184,17 +1666,334 @@ class OrfFinder:
         # tracks start codons in the - strand
         seen_start = set()
 
+        selected = []
         # iterates throught the sorted ORF list
-        for frame, start, stop, length in ORF:
+        for orf in ORF:
+            frame, start, stop, length = orf
             # if frame on the + strand, check if stop codon is already seen to avoid duplicates
             if frame.startswith("+") and stop not in seen_end:
                 # if not seen, now mark as seen
                 seen_end.add(stop)
-                # print in the correct format syntax
-                print(f"{frame} {start:>5d}..{stop:>5d} {length:>5d}")
+                selected.append(orf)
             # if frame on the - strand, check if start codon is already seen to avoid duplicates
             if frame.startswith("-") and start not in seen_start:
                 # if not seen, now mark as seen
                 seen_start.add(start)
-                # print in the correct format syntax
-                print(f"{frame} {start:>5d}..{stop:>5d} {length:>5d}")
\ No newline at end of file
+                selected.append(orf)
+        return selected
+
+    def ORF_final(self):
+        ''' Print the selected ORFs in the frame start..stop length format, with one write for all of them. '''
+        sys.stdout.write(''.join(f"{frame} {start:>5d}..{stop:>5d} {length:>5d}\n" for frame, start, stop, length in self.ORF_select()))
+
+class OrfWriter :
+    ''' Write the ORFs of many records in one format:
+        text: the ORF_final format, each record under its header
+        tsv: seqid, frame, start, stop and length columns with a header row
+        bed: BED6 with 0-based starts, one line per ORF
+        gff3: GFF3 ORF features
+        npz: numpy columns seqid, frame (+1..+3, -1..-3), start, stop and length, for loading without parsing
+    The lines of a record are joined and written at once, to a buffered file or stdout. npz gathers the columns and writes them at close.
+    '''
+    formats = ('text', 'tsv', 'bed', 'gff3', 'npz')
+
+    def __init__(self, format = 'text', fileName = None):
+        if format not in OrfWriter.formats:
+            raise ValueError('{} is not an ORF output format, use one of {}'.format(format, ', '.join(OrfWriter.formats)))
+        if format == 'npz' and np is None:
+            raise ImportError('the npz ORF output needs numpy')
+        self.format = format
+        self.fileName = fileName
+        # ORFs written so far, which numbers the BED and GFF3 features
+        self.count = 0
+        self.columns = ([], [], [], [], [])
+        if format == 'npz':
+            self.out = None
+        elif fileName is None:
+            self.out = sys.stdout
+        else:
+            self.out = open(fileName, 'w', buffering = 1 << 20)
+        if format == 'tsv':
+            self.out.write('seqid\tframe\tstart\tstop\tlength\n')
+        elif format == 'gff3':
+            self.out.write('##gff-version 3\n')
+
+    def write(self, header, ORF):
+        ''' Write the ORF tuples of the record with this header, in the given order. '''
+        # the sequence id is the first word of the header
+        seqid = header.split()[0] if header.split() else header
+        first = self.count + 1
+        self.count += len(ORF)
+        if self.format == 'text':
+            lines = [header + '\n'] + [f"{frame} {start:>5d}..{stop:>5d} {length:>5d}\n" for frame, start, stop, length in ORF]
+        elif self.format == 'tsv':
+            lines = [f"{seqid}\t{frame}\t{start}\t{stop}\t{length}\n" for frame, start, stop, length in ORF]
+        elif self.format == 'bed':
+            lines = [f"{seqid}\t{start - 1}\t{stop}\torf{n}\t0\t{frame[0]}\n"
+                     for n, (frame, start, stop, length) in enumerate(ORF, first)]
+        elif self.format == 'gff3':
+            lines = [f"{seqid}\tfindORF\tORF\t{start}\t{stop}\t.\t{frame[0]}\t0\tID=orf{n};frame={frame};length={length}\n"
+                     for n, (frame, start, stop, length) in enumerate(ORF, first)]
+        else:
+            seqids, frames, starts, stops, lengths = self.columns
+            seqids.extend([seqid] * len(ORF))
+            for frame, start, stop, length in ORF:
+                frames.append(int(frame))
+                starts.append(start)
+                stops.append(stop)
+                lengths.append(length)
+            return
+        self.out.write(''.join(lines))
+
+    def close(self):
+        ''' Write the npz columns and close the output file. stdout is only flushed. '''
+        if self.format == 'npz':
+            seqids, frames, starts, stops, lengths = self.columns
+            out = sys.stdout.buffer if self.fileName is None else self.fileName
+            np.savez_compressed(out, seqid = np.array(seqids, dtype = str), frame = np.array(frames, dtype = np.int8),
+                                start = np.array(starts, dtype = np.int64), stop = np.array(stops, dtype = np.int64),
+                                length = np.array(lengths, dtype = np.int64))
+        elif self.out is sys.stdout:
+            self.out.flush()
+        else:
+            self.out.close()
+
+import bisect
+class OrfIndex :
+    ''' ORFs of many records, indexed for region queries per record and strand: overlap, within, containing and nearest.
+    Every (seqid, strand) holds its ORFs sorted by start with an implicit augmented interval tree over the sorted array: node i of level k
+    keeps the largest stop under it, so an overlap query skips every subtree that ends before the region, in O(log n + hits).
+    Coordinates are the ones of the ORF tuples, 1-based and inclusive. Strand is '+' or '-'.
+    save writes the findORF tsv format and load reads it back, so the index can be kept next to its FastA file, like the .fai index.
+    '''
+    def __init__(self):
+        # (seqid, strand) -> ORF tuples, and the index built from them on the first query
+        self.records = {}
+        self.trees = {}
+
+    def add(self, seqid, ORF):
+        ''' Add the ORF tuples of record seqid, for example OrfFinder.ORF or ORF_select(). '''
+        for orf in ORF:
+            key = (seqid, orf[0][0])
+            self.records.setdefault(key, []).append(orf)
+            self.trees.pop(key, None)
+
+    def __len__(self):
+        return sum(len(ORF) for ORF in self.records.values())
+
+    def _tree(self, seqid, strand):
+        ''' The index of one record strand: ORFs sorted by start, their 0-based starts and ends, the largest end under every tree node,
+        the top level of the tree and, for nearest, the ORF with the largest end up to every position. '''
+        key = (seqid, strand)
+        if key not in self.trees:
+            ORF = sorted(self.records.get(key, ()), key = lambda x: (x[1], x[2]))
+            starts = [orf[1] - 1 for orf in ORF]
+            ends = [orf[2] for orf in ORF]
+            maxEnds = list(ends)
+            n = len(ORF)
+            level = -1
+            if n:
+                # the leaves are the even positions. every level up, node i covers i - 2^k + 1 .. i + 2^k - 1
+                lastI = (n - 1) & ~1
+                last = maxEnds[lastI]
+                level = 1
+                while 1 << level <= n:
+                    x = 1 << (level - 1)
+                    for i in range((x << 1) - 1, n, x << 2):
+                        # the right child may be past the end of the array, the last node then stands in for it
+                        right = maxEnds[i + x] if i + x < n else last
+                        maxEnds[i] = max(ends[i], maxEnds[i - x], right)
+                    lastI = lastI - x if lastI >> level & 1 else lastI + x
+                    if lastI < n and maxEnds[lastI] > last:
+                        last = maxEnds[lastI]
+                    level += 1
+                level -= 1
+            # position of the largest end among the ORFs up to every position, the left neighbour for nearest
+            farthest = []
+            for i, end in enumerate(ends):
+                farthest.append(i if not farthest or end > ends[farthest[-1]] else farthest[-1])
+            self.trees[key] = (ORF, starts, ends, maxEnds, level, farthest)
+        return self.trees[key]
+
+    def overlap(self, seqid, strand, start, stop):
+        ''' ORFs that share at least one base with start..stop, sorted by start. '''
+        ORF, starts, ends, maxEnds, level, farthest = self._tree(seqid, strand)
+        n = len(ORF)
+        # half-open 0-based region, like starts and ends
+        begin, end = start - 1, stop
+        found = []
+        # (node, level, left child done) of the subtrees to visit
+        stack = [((1 << level) - 1, level, False)] if n else []
+        while stack:
+            x, k, leftDone = stack.pop()
+            if k <= 3:
+                # small subtrees are scanned in order
+                i = x >> k << k
+                i1 = min(i + (1 << (k + 1)) - 1, n)
+                while i < i1 and starts[i] < end:
+                    if begin < ends[i]:
+                        found.append(i)
+                    i += 1
+            elif not leftDone:
+                stack.append((x, k, True))
+                left = x - (1 << (k - 1))
+                # the left subtree is only visited when something under it reaches the region
+                if left >= n or maxEnds[left] > begin:
+                    stack.append((left, k - 1, False))
+            elif x < n and starts[x] < end:
+                if begin < ends[x]:
+                    found.append(x)
+                stack.append((x + (1 << (k - 1)), k - 1, False))
+        return [ORF[i] for i in sorted(found)]
+
+    def within(self, seqid, strand, start, stop):
+        ''' ORFs that lie completely inside start..stop, sorted by start. '''
+        ORF, starts, ends, maxEnds, level, farthest = self._tree(seqid, strand)
+        first = bisect.bisect_left(starts, start - 1)
+        last = bisect.bisect_left(starts, stop)
+        return [ORF[i] for i in range(first, last) if ends[i] <= stop]
+
+    def containing(self, seqid, strand, start, stop):
+        ''' ORFs that cover all of start..stop, sorted by start. '''
+        return [orf for orf in self.overlap(seqid, strand, start, stop) if orf[1] <= start and orf[2] >= stop]
+
+    def nearest(self, seqid, strand, start, stop = None):
+        ''' The ORF closest to start..stop (or to the position start): the first overlapping one, otherwise the one with the fewest bases
+        between it and the region, the left one on a tie. None when the strand has no ORFs. '''
+        stop = start if stop is None else stop
+        hits = self.overlap(seqid, strand, start, stop)
+        if hits:
+            return hits[0]
+        ORF, starts, ends, maxEnds, level, farthest = self._tree(seqid, strand)
+        # nothing overlaps, so every ORF that starts before the region also ends before it
+        i = bisect.bisect_left(starts, start - 1)
+        left = ORF[farthest[i - 1]] if i else None
+        right = ORF[bisect.bisect_left(starts, stop)] if bisect.bisect_left(starts, stop) < len(ORF) else None
+        if left is None or (right is not None and right[1] - stop < start - left[2]):
+            return right
+        return left
+
+    def save(self, fileName):
+        ''' Write the ORFs in the findORF tsv format (seqid, frame, start, stop, length). '''
+        with open(fileName, 'w', buffering = 1 << 20) as out:
+            out.write('seqid\tframe\tstart\tstop\tlength\n')
+            out.write(''.join(f"{seqid}\t{frame}\t{start}\t{stop}\t{length}\n"
+                              for (seqid, strand), ORF in self.records.items() for frame, start, stop, length in ORF))
+
+    @classmethod
+    def load(cls, fileName):
+        ''' Read an index saved by save, or written by findORF -f tsv. '''
+        index = cls()
+        with open(fileName) as ORFs:
+            next(ORFs, None)
+            for line in ORFs:
+                seqid, frame, start, stop, length = line.rstrip('\n').split('\t')
+                index.records.setdefault((seqid, frame[0]), []).append((frame, int(start), int(stop), int(length)))
+        return index
+
+class ProteinTable :
+    ''' Translate the ORFs of every record with NucParams.dnaCodonTable and write one table row per protein with its ProteinParam metrics:
+    seqid, frame, start, stop, length, aaCount, molecularWeight, molarExtinction, massExtinction, pI and the protein itself.
+    Proteins are gathered in batches of batchSize, characterized together by ProteinBatch and written with one write per batch.
+    '''
+    # translate uses the numpy codon index and flush uses ProteinBatch whenever numpy is installed. set to False for plain python
+    useNumpy = np is not None
+    # codon index (16*a + 4*b + c of the base codes) -> amino acid letter. indexes past 63 hold a base that is not A, C, G or T
+    aaBytes = None
+
+    def __init__(self, fileName = None, batchSize = 1000):
+        self.out = sys.stdout if fileName is None else open(fileName, 'w', buffering = 1 << 20)
+        self.batchSize = batchSize
+        # (seqid, ORF tuple, protein) rows waiting for their metrics
+        self.batch = []
+        self.out.write('seqid\tframe\tstart\tstop\tlength\taaCount\tmolecularWeight\tmolarExtinction\tmassExtinction\tpI\tprotein\n')
+
+    @classmethod
+    def _aaBytes(cls):
+        ''' Build the codon index -> amino acid letter table from NucParams.dnaCodonTable. X for a codon with any other base. '''
+        if NucParams.baseCodes is None:
+            NucParams._numpyTables()
+        table = np.full(16 * 64 + 4 * 64 + 64 + 1, ord('X'), dtype=np.uint8)
+        for index, codon in enumerate(NucParams.codonOrder):
+            table[index] = ord(NucParams.dnaCodonTable[codon.replace('U', 'T')])
+        cls.aaBytes = table
+
+    def translate(self, seq, ORF):
+        ''' Translate ORF tuples of seq (str, bytes or Sequence) into proteins, without the stop codon at their end. Bottom strand ORFs are read on the reverse complement. '''
+        if ProteinTable.useNumpy:
+            return self._translateIndexed(seq, ORF)
+        table = NucParams.dnaCodonTable
+        seq = seq.data if isinstance(seq, Sequence) else seq
+        proteins = []
+        for frame, start, stop, length in ORF:
+            gene = seq[start - 1:stop]
+            gene = (gene.decode('ascii', 'replace') if isinstance(gene, (bytes, bytearray)) else gene).upper()
+            if frame.startswith('-'):
+                gene = gene[::-1].translate(OrfFinder.compTrans)
+            # the reading frame is the one of the stop codon. an ORF that runs in from the sequence end can have 1 or 2 extra bases in front
+            gene = gene[len(gene) % 3:]
+            proteins.append(''.join(table.get(gene[i:i+3], 'X') for i in range(0, len(gene), 3)).removesuffix('-'))
+        return proteins
+
+    def _translateIndexed(self, seq, ORF):
+        ''' numpy translation: every position of seq gets the amino acid of the codon starting there on both strands, from the codon indexes
+        of the Sequence (made here for a str or bytes). A protein is then a strided slice of one of those arrays. '''
+        if ProteinTable.aaBytes is None:
+            ProteinTable._aaBytes()
+        seq = seq if isinstance(seq, Sequence) else Sequence(seq)
+        if len(seq) < 3:
+            return ['' for orf in ORF]
+        forward = ProteinTable.aaBytes[seq.codonIndex('+')]
+        # the bottom strand index holds the reverse complement codon of every top strand position
+        reverse = ProteinTable.aaBytes[seq.codonIndex('-')]
+        proteins = []
+        for frame, start, stop, length in ORF:
+            # the reading frame is the one of the stop codon. an ORF that runs in from the sequence end can have 1 or 2 extra bases in front
+            if frame.startswith('+'):
+                protein = forward[start - 1 + length % 3:stop - 2:3]
+            else:
+                # the bottom strand gene starts at the right end and reads to the left
+                protein = reverse[stop - 3 - length % 3::-3][:length // 3]
+            proteins.append(protein.tobytes().decode().removesuffix('-'))
+        return proteins
+
+    def write(self, header, seq, ORF):
+        ''' Translate the ORFs of the record with this header and add them to the table. '''
+        seqid = header.split()[0] if header.split() else header
+        for orf, protein in zip(ORF, self.translate(seq, ORF)):
+            self.batch.append((seqid, orf, protein))
+            if len(self.batch) >= self.batchSize:
+                self.flush()
+
+    def flush(self):
+        ''' Characterize the proteins of the batch and write their rows. With numpy the whole batch goes through ProteinBatch at once,
+        otherwise every protein gets its own ProteinParam. '''
+        if not self.batch:
+            return
+        if ProteinTable.useNumpy:
+            params = ProteinBatch([protein for seqid, orf, protein in self.batch])
+            metrics = zip(params.aaCount().tolist(), params.molecularWeight().tolist(), params.molarExtinction().tolist(),
+                          params.massExtinction().tolist(), params.pI().tolist())
+        else:
+            metrics = []
+            for seqid, orf, protein in self.batch:
+                param = ProteinParam(protein)
+                count = param.aaCount()
+                # a protein without a single valid amino acid (all X) has no weight
+                weight = param.molecularWeight() if count else 0.0
+                molar = param.molarExtinction()
+                metrics.append((count, weight, molar, molar / weight if weight else 0.0, param.pI()))
+        lines = []
+        for (seqid, (frame, start, stop, length), protein), (count, weight, molar, mass, pI) in zip(self.batch, metrics):
+            lines.append(f"{seqid}\t{frame}\t{start}\t{stop}\t{length}\t{count}\t{weight:.1f}\t{molar:.2f}\t"
+                         f"{mass:.2f}\t{pI:.2f}\t{protein}\n")
+        self.out.write(''.join(lines))
+        self.batch = []
+
+    def close(self):
+        ''' Write the last batch and close the table file. stdout is only flushed. '''
+        self.flush()
+        if self.out is sys.stdout:
+            self.out.flush()
+        else:
+            self.out.close()
@@ -0,0 +1,19 @@
+import os
+import findORF
+
+# the genes of the genome project, found from this folder wherever pytest is started
+genes = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Genome Sequence Analysis', 'haloVolc1_1-genes.fa')
+
+
+def run(capsys, options):
+    ''' The stdout of findORF.main for options. '''
+    findORF.main(options = options)
+    return capsys.readouterr().out
+
+
+def test_stream_matches_whole_records(capsys):
+    # --stream feeds the records in blocks, the ORFs and their headers must be the same as reading whole records
+    whole = run(capsys, [genes, '-mG=300', '-f', 'tsv'])
+    streamed = run(capsys, [genes, '-mG=300', '-f', 'tsv', '--stream'])
+    assert streamed == whole
+    assert streamed.count('\n') > 1
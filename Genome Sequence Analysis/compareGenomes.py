@@ -1,24 +1,16 @@
-from sequenceAnalysis import NucParams, FastAreader
+from sequenceAnalysis import NucParams, FastAreader, CompositionCache
 import sys
 
-def main (halophileFileName = None, hyperthermophileFileName = None):
-    ''' Program compares GC content, aaComposition and relative codon bias of 2 genomes. In this assignment, I will be comparing a halophile genome and a hyperthermophile genome. '''
-      
-    # call FastAreader function to read both the halophileFileName and hyperthermophileFileName contents
-    halophileReader = FastAreader(halophileFileName)
-    hyperthermophileReader = FastAreader(hyperthermophileFileName)
+def main (halophileFileName = None, hyperthermophileFileName = None, useCache = True):
+    ''' Program compares GC content, aaComposition and relative codon bias of 2 genomes. In this assignment, I will be comparing a halophile genome and a hyperthermophile genome. 
+    With useCache the counts of both files are taken from the CompositionCache when the files did not change since the last run. '''
 
     # call the NucParams function to get all of the needed information like aaComposition, nucComposition, and codonComposition that I can use later on to compare the 2 genomes together
-    halophileNuc = NucParams()
-    hyperthermophileNuc = NucParams()
-
     # process the 2 genomes
     # find the counts of inSeq nucleotide bases, codons, and codons' AA composition
-    for i, seq in halophileReader.readFasta() :
-        halophileNuc.addSequence(seq)
-
-    for i, seq in hyperthermophileReader.readFasta() :
-        hyperthermophileNuc.addSequence(seq)
+    cache = CompositionCache() if useCache else None
+    halophileNuc = loadGenome(halophileFileName, cache)
+    hyperthermophileNuc = loadGenome(hyperthermophileFileName, cache)
 
     # use the helper function to calculate the GC content of the 2 genomes
     halophileGC = gc(halophileNuc)
@@ -37,6 +29,23 @@ def main (halophileFileName = None, hyperthermophileFileName = None):
     # call the helper function codon_bias which prints out the codon bias comparison between the 2 genomes
     codon_bias(halophileNuc, hyperthermophileNuc)
 
+
+# helper function to count a genome
+def countGenome (fileName):
+    ''' Finds the counts of the nucleotide bases, codons, and codons' AA composition of one genome. '''
+    # call FastAreader function to read the file contents
+    reader = FastAreader(fileName, asBytes=True)
+    nuc = NucParams()
+    for i, seq in reader.readFasta() :
+        nuc.addSequence(seq)
+    return nuc
+
+# helper function to load a genome through the cache
+def loadGenome (fileName, cache = None):
+    ''' Counts a genome, or takes its counts from cache when the file was counted before. STDIN is never cached. '''
+    if cache is None or fileName is None:
+        return countGenome(fileName)
+    return cache.load(fileName, countGenome)
     
 # helper function to calculate GC content
 def gc (nuc):
@@ -114,5 +123,92 @@ def codon_bias(nuc1, nuc2):
         # print out the relative codon biases from Halophile and Hyperthermophile and compare/find their differences
         print(f'{codon1}: Halophile = {count1}, Hyperthermophile = {count2}, Difference = {abs(count2 - count1)}') 
 
+def compositionTable (nucs):
+    ''' Turn a list of NucParams into one table of numpy arrays, one row per genome:
+    gc (N), aa (N x 21 percentages), codon (N x 64 codon frequencies) and relativeCodon (N x 64 codon count / count of its amino acid). '''
+    import numpy as np
+    # same order as genomeAnalyzer: by amino acid, then alphabetically
+    codons = sorted(NucParams.rnaCodonTable, key = lambda x: (NucParams.rnaCodonTable[x], x))
+    aas = list(nucs[0].aaComp)
+    nucCounts = np.array([[nuc.nucComp[base] for base in 'ACGTUN'] for nuc in nucs], dtype=float)
+    codonCounts = np.array([[nuc.codonComp[codon] for codon in codons] for nuc in nucs], dtype=float)
+    aaCounts = np.array([[nuc.aaComp[aa] for aa in aas] for nuc in nucs], dtype=float)
+    # amino acid count of the amino acid every codon codes for, for the relative codon usage
+    codonAa = aaCounts[:, [aas.index(NucParams.rnaCodonTable[codon]) for codon in codons]]
+
+    # empty rows would divide by 0, they stay 0 instead
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table = {
+            'codons': codons,
+            'aas': aas,
+            'gc': np.nan_to_num((nucCounts[:, 1] + nucCounts[:, 2]) / nucCounts.sum(axis=1) * 100),
+            'aa': np.nan_to_num(aaCounts / aaCounts.sum(axis=1, keepdims=True) * 100),
+            'codon': np.nan_to_num(codonCounts / codonCounts.sum(axis=1, keepdims=True)),
+            'relativeCodon': np.nan_to_num(codonCounts / codonAa),
+        }
+    return table
+
+def distanceMatrices (freq):
+    ''' Pairwise distances between the rows of freq (N x 64 codon frequencies): the euclidean distance and the Jensen-Shannon divergence (in bits). '''
+    import numpy as np
+    # N x N x 64 differences, every pair at once
+    euclidean = np.sqrt(((freq[:, None, :] - freq[None, :, :]) ** 2).sum(axis=2))
+
+    # JS = (KL(P || M) + KL(Q || M)) / 2 with M the mean of P and Q. terms with a 0 frequency count as 0
+    mean = (freq[:, None, :] + freq[None, :, :]) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kl = np.where(freq[:, None, :] > 0, freq[:, None, :] * np.log2(freq[:, None, :] / mean), 0).sum(axis=2)
+    js = (kl + kl.T) / 2
+    return euclidean, js
+
+def loadGenomes (fileNames, jobs = None, useCache = True):
+    ''' Count all genomes at the same time on a pool of worker processes. Returns their NucParams in the order of fileNames. '''
+    from concurrent.futures import ProcessPoolExecutor
+    cache = CompositionCache() if useCache else None
+    with ProcessPoolExecutor(jobs) as pool:
+        return list(pool.map(loadGenome, fileNames, [cache] * len(fileNames)))
+
+def compareMany (fileNames, names = None, jobs = None, useCache = True):
+    ''' Compare any number of genomes: prints the GC content, amino acid composition and codon usage of every genome side by side,
+    and the pairwise codon usage distances. Returns the table from compositionTable with the distance matrices added. '''
+    import os
+    # genomes are named after their file, without the extension
+    names = names or [os.path.splitext(os.path.basename(fileName))[0] for fileName in fileNames]
+    table = compositionTable(loadGenomes(fileNames, jobs, useCache))
+    table['names'] = names
+    table['euclidean'], table['js'] = distanceMatrices(table['codon'])
+
+    # one tab separated block per measure, a column for every genome
+    header = '\t'.join([''] + names)
+    print('GC content (%)')
+    print(header)
+    print('\t'.join(['GC'] + ['{:.1f}'.format(value) for value in table['gc']]))
+    print()
+    print('amino acid composition (%)')
+    print(header)
+    for i, aa in enumerate(table['aas']):
+        print('\t'.join([aa] + ['{:.2f}'.format(value) for value in table['aa'][:, i]]))
+    print()
+    print('relative codon usage (%)')
+    print(header)
+    for i, codon in enumerate(table['codons']):
+        print('\t'.join(['{} {}'.format(codon, NucParams.rnaCodonTable[codon])] + ['{:.1f}'.format(value * 100) for value in table['relativeCodon'][:, i]]))
+    for title, matrix in (('codon usage euclidean distance', table['euclidean']), ('codon usage Jensen-Shannon divergence (bits)', table['js'])):
+        print()
+        print(title)
+        print(header)
+        for name, row in zip(names, matrix):
+            print('\t'.join([name] + ['{:.4f}'.format(value) for value in row]))
+    return table
+
 if __name__ == "__main__":
-    main("haloVolc1_1-genes.fa", "testGenome.fa")
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description = 'Compare the GC content, amino acid composition and codon usage of genomes')
+    parser.add_argument('fileNames', nargs='*', help='FastA files to compare. without files the halophile and hyperthermophile genomes are compared')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of processes used to load the genomes')
+    parser.add_argument('--no-cache', dest='useCache', action='store_false', help='always parse the files, do not use the composition cache')
+    args = parser.parse_args()
+    if args.fileNames:
+        compareMany(args.fileNames, jobs = args.jobs, useCache = args.useCache)
+    else:
+        main("haloVolc1_1-genes.fa", "testGenome.fa", useCache = args.useCache)
\ No newline at end of file
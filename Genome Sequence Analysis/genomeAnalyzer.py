@@ -1,12 +1,60 @@
-from sequenceAnalysis import NucParams, FastAreader
+from sequenceAnalysis import NucParams, FastAreader, CompositionCache
 import sys
 
-def main (fileName=None):
-    ''' Finds the sequence length, GC content, and relative codon usage for the genome sequence. '''
-    myReader = FastAreader(fileName) 
+def countRange (fileName, start=None, end=None):
+    ''' Count one byte range of fileName (the whole file, or STDIN, without a range). Runs in a worker process when main gets jobs. '''
     myNuc = NucParams()
-    for head, seq in myReader.readFasta() :
-        myNuc.addSequence(seq)
+    # pipe fixed size blocks from the file into myNuc, so memory does not grow with the largest record
+    # a header means a new record starts, which has its own reading frame
+    for head, chunk in FastAreader(fileName, asBytes=True).readChunks(start, end):
+        if head is not None:
+            myNuc.finish()
+        myNuc.feed(chunk)
+    myNuc.finish()
+    return myNuc
+
+def countParallel (fileName, jobs):
+    ''' Split fileName into byte ranges at record boundaries, count them on a pool of jobs processes and add the partial counts up in file order. '''
+    from concurrent.futures import ProcessPoolExecutor
+    # a few ranges per process, so one large record does not leave the other processes idle
+    ranges = FastAreader(fileName).splitRanges(4 * jobs)
+    myNuc = NucParams()
+    with ProcessPoolExecutor(jobs) as pool:
+        for part in pool.map(countRange, [fileName] * len(ranges), *zip(*ranges)):
+            myNuc.merge(part)
+    return myNuc
+
+def countGenome (fileName=None, contigs=None, useMmap=False, jobs=1):
+    ''' Count the nucleotides, codons and amino acids of fileName, or of the listed contigs only. Returns a NucParams. '''
+    myReader = FastAreader(fileName, asBytes=True) 
+    myNuc = NucParams()
+    # plain gzip can only be read from the start, so it is counted by one process like STDIN
+    if jobs > 1 and fileName is not None and not contigs and myReader.compression() != 'gzip':
+        myNuc = countParallel(fileName, jobs)
+    elif useMmap:
+        # feed every memory mapped record in blocks, finish ends its reading frame
+        for head, seq in myReader.mapFasta(contigs):
+            for chunk in seq.chunks():
+                myNuc.feed(chunk)
+            myNuc.finish()
+    # with contigs, seek straight to the wanted records instead of streaming the whole file
+    elif contigs:
+        for head, seq in myReader.readRecords(contigs):
+            myNuc.addSequence(seq)
+    else:
+        myNuc = countRange(fileName)
+    return myNuc
+
+def main (fileName=None, contigs=None, useMmap=False, jobs=1, useCache=True):
+    ''' Finds the sequence length, GC content, and relative codon usage for the genome sequence. 
+    When contigs is a list of record names, only those records are read, using the FastA index of fileName.
+    useMmap memory maps fileName instead of reading it, so the records are never copied into memory as a whole.
+    jobs > 1 counts fileName on that many processes, the output is the same as the serial run. STDIN and plain gzip files are always counted serially.
+    With useCache the counts of a whole file are kept in a CompositionCache, so a file that did not change is not parsed again. '''
+    if useCache and fileName is not None and not contigs:
+        myNuc = CompositionCache().load(fileName, lambda name: countGenome(name, useMmap = useMmap, jobs = jobs))
+    else:
+        myNuc = countGenome(fileName, contigs, useMmap, jobs)
 
     # get the total number of nucleotides in sequence
     totalNuc = myNuc.nucCount()
@@ -38,4 +86,14 @@ def main (fileName=None):
             print ('{:s} : {:s} {:5.1f} ({:6d})'.format(i, aa, val*100, j))
     
 if __name__ == "__main__":
-    main() # changed in order to use stdin
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description = 'Sequence length, GC content and relative codon usage of a genome')
+    parser.add_argument('fileName', nargs='?', default=None, help='FastA file, STDIN when left out')
+    parser.add_argument('-c', '--contig', action='append', default=None, help='only count this record, found through the .fai index (needs fileName). repeat it for more records')
+    parser.add_argument('--mmap', dest='useMmap', action='store_true', help='memory map fileName instead of reading it')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes used to count the file')
+    parser.add_argument('--no-cache', dest='useCache', action='store_false', help='always parse the file, do not use the composition cache')
+    args = parser.parse_args()
+    if (args.contig or args.useMmap) and args.fileName is None:
+        parser.error('--contig and --mmap need a fileName, STDIN can not be indexed')
+    main(args.fileName, args.contig, args.useMmap, args.jobs, args.useCache) # changed in order to use stdin
\ No newline at end of file
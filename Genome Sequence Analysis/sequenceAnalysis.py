@@ -2,6 +2,7 @@
 # Name: Shreya Handa (shanda1)
 # Group Members: Architha Dhavala (adhavala), Arya Ashok (aashok)
 
+from array import array
 class ProteinParam :
 # These tables are for calculating:
 #     molecular weight (aa2mw), along with the mol. weight of H2O (mwH2O)
@@ -29,18 +30,41 @@ class ProteinParam :
     aaNterm = 9.69
     aaCterm = 2.34
 
+    # the charge model used by _charge_ and pI: the counts of the 7 ionizable amino acids (positive ones first) and their 10 ** pKa,
+    # computed once here instead of in every _charge_ call
+    ionizable = tuple(aa2chargePos) + tuple(aa2chargeNeg)
+    posPowers = tuple(map((10.0).__pow__, aa2chargePos.values()))
+    negPowers = tuple(map((10.0).__pow__, aa2chargeNeg.values()))
+    ntermPower = 10 ** aaNterm
+    ctermPower = 10 ** aaCterm
+    # ionizable counts -> pH of zero charge, shared by all proteins. proteomes have many proteins with the same counts
+    pICache = {}
+    # the most entries pICache holds, the oldest are dropped first. about 13 MB when full
+    pICacheSize = 1 << 16
+
+    # the valid amino acids in the order of aa_dict, which is the order of the counts array, and the position of each one
+    aaOrder = 'ACDEFGHILKMNPQRSTVYW'
+    aaIndex = {aa: index for index, aa in enumerate(aaOrder)}
+
+    # a ProteinParam only holds these, no __dict__, so hundreds of thousands of them stay small.
+    # counts is the fixed array of the 20 amino acid counts, _weight and _root are filled in the first time they are needed
+    __slots__ = ('protein', 'counts', '_weight', '_root')
+
     def __init__ (self, protein):
         # ignore any spaces in the inputted protein and transform any lowercase letters to uppercase
         self.protein = protein.strip().upper()
-        # initialze a dictionary with all valid amino acids and their values to 0
-        # i use this dictionary later on to store the count of each amino acid in the protein sequence
-        self.aa_dict = {"A" : 0, "C" : 0, "D" : 0, "E" : 0, "F" : 0, "G" : 0, "H" : 0, "I" : 0, "L" : 0, "K" : 0, 
-                        "M" : 0, "N" : 0, "P" : 0, "Q" : 0, "R" : 0, "S" : 0, "T" : 0, "V" : 0, "Y" : 0, "W" : 0}
-        # initialize the count of each amino acid here so that I can access it when doing calculations in other functions
-        self.init_aaComposition()
-        
+        # count every valid amino acid with a C level str.count, no python loop over the residues. invalid characters are never counted
+        self.counts = array('I', map(self.protein.count, ProteinParam.aaOrder))
+        self._weight = None
+        self._root = None
+
+    @property
+    def aa_dict (self):
+        ''' The count of every valid amino acid as a dictionary, made from the counts array. '''
+        return dict(zip(ProteinParam.aaOrder, self.counts))
+
     def init_aaComposition (self) :
-        ''' This method finds the count of each valid amino acid in the inputted protein sequence.
+        ''' This method finds the count of each valid amino acid in the inputted protein sequence. The counting is done once in __init__.
 
         Example:
             input: VLSPADKTNVKAAW
@@ -48,18 +72,6 @@ class ProteinParam :
                         "M" : 0, "N" : 1, "P" : 1, "Q" : 0, "R" : 0, "S" : 1, "T" : 1, "V" : 2, "Y" : 0, "W" : 1}
 
         '''
-        # call the function aaCount and get the total amount of valid amino acids in the protein sequence. store the value in total
-        total = self.aaCount()
-
-        # look through each amino acid in the inputted protein
-        for i in self.protein:
-            # self.aa_dict contains all valid characters. if the amino acid is in there, that means it is a valid amino acid
-            # if amino acid is not in self.aa_dict, then does nothing/ignores
-            if i in self.aa_dict:
-                # if a valid amino acid, increment that specific's amino acid's count by 1
-                self.aa_dict[i] += 1
-
-        # return self.aa_dict which now holds the count of each amino acid
         return self.aa_dict
 
     def aaCount (self):
@@ -69,18 +81,8 @@ class ProteinParam :
             input: VLSPADKTNVKAAW
             output: 14
         '''
-        # intializes a counter that will hold the the count of all amino acid characters found
-        count = 0
-        # look through each amino acid in the inputted protein
-        for i in self.protein:
-            # self.aa_dict contains all valid characters. if the amino acid is in there, that means it is a valid amino acid
-            # if amino acid is not in self.aa_dict, then does nothing/ignores
-            if i in self.aa_dict:
-                # incremenets the count because one more valid amino acid was found
-                count += 1
-        # returns the final count after the for loop is done looping through the entire sequence
-        return count
-        pass
+        # the sum of the counts array, every valid amino acid was counted in __init__
+        return sum(self.counts)
 
     '''
     ORIGINAL PI (using a different approach)
@@ -107,50 +109,86 @@ class ProteinParam :
     '''
     
     def pI(self, precision = 2):
-        ''' This method finds the pH that yields a neutral net Charge that is closest to 0. It does so by the use of binary search. It has initial 
-        low and high values and uses the _charge_ function to calculate their charges. After calculation of the midpoint, it checks if middle_charge is 
-        equal to, greater than, or less than 0 in addition to whether the low charge is greater than or less than 0. It adjusts the boundaries of the 
-        search tree accordingly. '''
+        ''' This method finds the pH that yields a neutral net Charge that is closest to 0. The pH of zero charge is solved with solveCharge
+        (memoized by the ionizable counts), then the binary search over 0-14 that pI always used is replayed against it: every middle below the
+        zero charge pH has a positive charge and moves low up, every middle above it moves high down. So the pI is the same as the search
+        that called _charge_ at every step, for any precision, without calling it at all. '''
+        # the zero charge pH is kept after the first pI, so another precision only replays the search
+        if self._root is None:
+            self._root = self.solveCharge(self.ionizableCounts())
+        return self.bisectTo(self._root, precision)
+
+    @staticmethod
+    def bisectTo(root, precision = 2):
+        ''' The binary search over 0-14 for a charge that crosses zero at pH root, until low and high are closer than 10^-precision. '''
         # set the lower and upper bounds for binary search
         low = 0.0
         high = 14.0
         # set the precision which is 10^-2 = 0.01
         prec = 10 ** (-precision)
-    
-        # calculate the charge for the lower and upper boundary
-        # do this to check for zero crossing in the initial values. if it does, change the boundaries accordingly
-        low_charge = self._charge_(low)
-        high_charge = self._charge_(high)
-
-        # ensures the difference between high and low is not less than 0.01
         while high - low > prec:
-            # find the middle point of the binary search and its charge
-            # this middle point is used later on in the code to adjust boundaries
             middle = (low + high) / 2
-            middle_charge = self._charge_(middle)
-
-            # if the middle_charge is zero the first round, then immediately return value
-            if middle_charge == 0:
-                return round(middle, precision)  
-    
-            # if zero is not found first time, use binary search to adjust the high and low and bounderies of where to look
-            if middle_charge > 0 and low_charge > 0:
-                # crossing from negative to postive hasn't occured yet, so move lower boundary up to start searching from that new range
-                low = middle 
-            # since low_charge is negative and middle_charge is positive, this means zero crossing must be somewhere in the middle of these two values
-            elif middle_charge > 0 and low_charge < 0:
-                #crossing from negative to positive has occured, so move high down to middle and search from that new range
-                high = middle
-            elif middle_charge < 0 and low_charge < 0:
-                # crossing from negative to postive hasn't occured yet. both middle and low are less than 0, so move lower boundary up to start searching from that new range
+            # the charge is exactly zero in the middle
+            if middle == root:
+                return round(middle, precision)
+            # the charge falls with the pH, so it is still positive below the root
+            if middle < root:
                 low = middle
-            # since middle_charge is negative and low_charge is positive, this means zero crossing must be somewhere in the middle of these two values
-            elif middle_charge < 0 and low_charge > 0:
+            else:
                 high = middle
-
         # round the final pI to 2 decimal places
         return round((high + low) / 2, precision)
 
+    def ionizableCounts (self):
+        ''' The counts of the ionizable amino acids, in the order of ProteinParam.ionizable. '''
+        return tuple(self.counts[ProteinParam.aaIndex[aa]] for aa in ProteinParam.ionizable)
+
+    @classmethod
+    def chargeSlope (cls, counts, pH):
+        ''' Net charge and its derivative by pH of a protein with these ionizable counts. '''
+        H = 10 ** pH
+        charge = cls.ntermPower / (cls.ntermPower + H) - H / (cls.ctermPower + H)
+        slope = cls.ntermPower / (cls.ntermPower + H) ** 2 + cls.ctermPower / (cls.ctermPower + H) ** 2
+        for count, power in zip(counts, cls.posPowers):
+            charge += count * power / (power + H)
+            slope += count * power / (power + H) ** 2
+        for count, power in zip(counts[len(cls.posPowers):], cls.negPowers):
+            charge -= count * H / (power + H)
+            slope += count * power / (power + H) ** 2
+        # d/dpH of 10^pKa / (10^pKa + 10^pH) is -ln(10) 10^pKa 10^pH / (10^pKa + 10^pH)^2, the negative groups fall the same way
+        return charge, -2.302585092994046 * H * slope
+
+    @classmethod
+    def solveCharge (cls, counts):
+        ''' The pH where the charge is zero, by Newton steps on the smooth falling charge curve. A step that would leave the bracket of
+        known positive and negative charge bisects it instead. The charge has no zero inside 0-14 for extreme proteins, which gives inf:
+        the old binary search then ran up to 14. The latest pICacheSize results are kept in pICache by the counts. '''
+        if counts in cls.pICache:
+            return cls.pICache[counts]
+        if cls.chargeSlope(counts, 0.0)[0] < 0 or cls.chargeSlope(counts, 14.0)[0] > 0:
+            root = float('inf')
+        else:
+            low, high, root = 0.0, 14.0, 7.0
+            for step in range(200):
+                charge, slope = cls.chargeSlope(counts, root)
+                if charge == 0:
+                    break
+                if charge > 0:
+                    low = root
+                else:
+                    high = root
+                newton = root - charge / slope if slope else low
+                # the Newton step is already below the float resolution of the pH
+                if abs(newton - root) < 1e-13 or high - low < 1e-13:
+                    root = newton if low <= newton <= high else root
+                    break
+                root = newton if low < newton < high else (low + high) / 2
+        if len(cls.pICache) >= cls.pICacheSize:
+            # dicts keep insertion order, so the first key is the oldest result
+            del cls.pICache[next(iter(cls.pICache))]
+        cls.pICache[counts] = root
+        return root
+
 
     def aaComposition (self) :
         ''' Returns the count of each amino acid in a input sequence. Ignores any invalid amino acid letters and white spaces when counting. These
@@ -162,43 +200,29 @@ class ProteinParam :
                         "M" : 0, "N" : 1, "P" : 1, "Q" : 0, "R" : 0, "S" : 1, "T" : 1, "V" : 2, "Y" : 0, "W" : 1}
 
         '''
-        # returns self.aa_dict that is initialized in the init_aaComposition function above
+        # returns the aa_dict made from the counts of __init__
         return self.aa_dict
-        pass
 
     def _charge_ (self, pH):
-        ''' Calculates the net charge on the inputted protein at a specific pH. _charge_ is used to calculate the pI. I used the function given above and implemented the math in Python
-        coding language. '''
-        # initialize varaibles to pos and neg to 0 to later add the formaula to them
-        pos = 0
-        neg = 0
-
-        # go through and read each amino acid 
-        for i in self.aa_dict:
-            # if the amino is in self.aa2chargePos, apply the formaula to it
-            # i want to find the sum of all of the amino acids and their required values, so do pos+= to add previous caluclations to new ones
-            if i in self.aa2chargePos:
-                pos += self.aa_dict[i] * (10 ** self.aa2chargePos[i]) / (10 ** self.aa2chargePos[i] + 10 ** pH)
-            # if the amino is in self.aa2chargeNeg, apply the formaula to it
-            # i want to find the sum of all of the amino acids and their required values, so do neg+= to add previous caluclations to new ones
-            elif i in self.aa2chargeNeg: 
-                neg += self.aa_dict[i] * (10 ** pH) / (10 ** self.aa2chargeNeg[i] + 10 ** pH)
-
-        # apply Nterminus to the pos/basic value calculated with the formula above
-        pos += 1 * (10 ** self.aaNterm) / (10 ** self.aaNterm + 10 ** pH)
-        # apply Cterminus to the neg/acidic value calculated with the formula above
-        neg += 1 * (10 ** pH) / (10 ** self.aaCterm + 10 ** pH)
-
-        # find the net charge by subtracting pos - neg and return the value
-        net = pos - neg
-        return net
-        pass
+        ''' Calculates the net charge on the inputted protein at a specific pH. I used the function given above and implemented the math in Python
+        coding language, on the 7 ionizable counts with the 10 ** pKa values computed once in the class. '''
+        return self.chargeSlope(self.ionizableCounts(), pH)[0]
+
+    def charge_curve (self, ph_grid):
+        ''' The titration curve: net charge at every pH of ph_grid (a number, list or numpy array of any shape) with one numpy broadcast
+        instead of a _charge_ call per pH. Returns an array shaped like ph_grid. ProteinBatch.charge_curve does the same for many proteins.
+
+        Example:
+            input: VLSPADKTNVKAAW, [2, 7, 12]
+            output: array([ 2.67,  1.  , -1.93]) (rounded)
+        '''
+        return ProteinBatch.chargeMatrix(np.array([self.ionizableCounts()]), ph_grid)[0]
 
     # assigned Cystine == True because the code will otherwise produce a "missing 1 required positional argument" error
     def molarExtinction (self, Cystine = True):
         ''' This method finds the extinction coefficient which indicates how much light a protein absorbs at a certain wavelength. I use the 
         dictionary aa2abs280= {'Y':1490, 'W': 5500, 'C': 125} and formula given above to do so. I find the E_Y, E_W, and E_C by accessing their
-        values in the dictionary aa2abs280. I find the N_Y, N_W, and N_C by accessign their values/counts in the self.aa_dict I created. I then 
+        values in the dictionary aa2abs280. I find the N_Y, N_W, and N_C by accessign their values/counts in the self.counts array. I then 
         plug in their respective values in the formula (N_Y * E_Y) + (N_W * E_W) + (N_C * E_C). 
         
         Example:
@@ -215,19 +239,18 @@ class ProteinParam :
         else:
             E_C = 0
 
-        # find the N_Y, N_W, and N_C by accessign their values/counts in the self.aa_dict I created above
-        N_Y = self.aa_dict["Y"]
-        N_W = self.aa_dict["W"]
-        # checks if Cystine is True/present, if it is get it's N_C value from the dictionary. if it's False/not present, set it to 0 so it doesn't have an effect
+        # find the N_Y, N_W, and N_C by accessign their values/counts in the self.counts array made in __init__
+        N_Y = self.counts[ProteinParam.aaIndex["Y"]]
+        N_W = self.counts[ProteinParam.aaIndex["W"]]
+        # checks if Cystine is True/present, if it is get it's N_C value from the array. if it's False/not present, set it to 0 so it doesn't have an effect
         if Cystine == True:
-            N_C = self.aa_dict["C"]
+            N_C = self.counts[ProteinParam.aaIndex["C"]]
         else:
             N_C = 0
 
         # plug in calculated values in formula below. return the result
         molar = (N_Y * E_Y) + (N_W * E_W) + (N_C * E_C)
         return molar     
-        pass
 
     # assigned Cystine == True because the code will otherwise produce a "missing 1 required positional argument" error
     def massExtinction (self, Cystine = True):
@@ -245,37 +268,204 @@ class ProteinParam :
     def molecularWeight (self):
         '''
         This method calculates the molecular weight (MW) of the protein sequence. This is done by summing the weights of the individual amino acids 
-        and excluding the waters that are released with peptide bond formation. I access my self.aa_dict to get the count of each amino acid as well as
+        and excluding the waters that are released with peptide bond formation. I access my self.counts to get the count of each amino acid as well as
         the self.aa2mw to get the molecular weight of each amino acid. I also access the self.mwH2O to subtract the waters that are released with peptide
-        bond formation.
+        bond formation. The weight is kept after the first call, and a protein without valid amino acids weighs 0.
 
         Example:
             input: VLSPADKTNVKAAW
             output: 1499.7
         '''
+        if self._weight is not None:
+            return self._weight
         # initialize a weight varaible to 0
         weight = 0
-        # loop through self.aa_dict.items() and assign the i variable to the amino acid and the count varaible to the count of each amino acid
-        for i, count in self.aa_dict.items():
+        # loop through the amino acids and their counts, in aa_dict order so the sum rounds the same way as always
+        for i, count in zip(ProteinParam.aaOrder, self.counts):
             # apply the formula given in the directions above. multiply the moelcular weight of the amino acid to its count
             # sum every iteration together
             weight += self.aa2mw[i] * count
 
         # find the number of peptide bonds in the protein sequence. this will just be the count-1
-        if self.aaCount() > 0:
-            num_pb = self.aaCount() - 1
+        total = self.aaCount()
+        if total == 0:
+            self._weight = 0.0
+            return self._weight
+        num_pb = total - 1
 
         # subtract the waters that are released with each peptide bond by multiplying 
         num_pb *= self.mwH2O
-        mw = weight - num_pb
-        return mw
-        pass
+        self._weight = weight - num_pb
+        return self._weight
+
+
+class ProteinBatch :
+    ''' ProteinParam for many proteins at once. The amino acid counts of all proteins are one (N x 20) numpy matrix, with the columns in
+    aa_dict order, and every method returns one value per protein:
+        molarExtinction is a matrix product of the counts with the aa2abs280 values
+        molecularWeight adds the aa2mw weights of every column to all proteins at once
+        pI solves the zero charge pH of every distinct ionizable count row with vectorized Newton steps, like ProteinParam.pI
+    Results match ProteinParam to the printed precision. A protein without valid amino acids gets a molecular weight of 0.
+
+    Example:
+        batch = ProteinBatch(['VLSPADKTNVKAAW', 'MKWVTF'])
+        batch.molecularWeight() -> array([1499.71..., ...])
+    '''
+    # the amino acids in the order of ProteinParam.aa_dict, which are the columns of the count matrix
+    aaOrder = ProteinParam.aaOrder
+    # byte -> column of its amino acid, 20 for anything else. built on first use
+    aaColumns = None
+
+    def __init__ (self, proteins, names=None):
+        ''' proteins is an iterable of protein str or bytes, names optional names for them (like FastA headers). '''
+        if ProteinBatch.aaColumns is None:
+            columns = np.full(256, 20, dtype=np.int64)
+            for column, aa in enumerate(ProteinBatch.aaOrder):
+                columns[ord(aa)] = column
+            ProteinBatch.aaColumns = columns
+        # upper case every protein like ProteinParam does, then count all of them with one bincount over (protein, column) pairs
+        proteins = [protein.upper() if isinstance(protein, (bytes, bytearray)) else protein.upper().encode('ascii', 'replace') for protein in proteins]
+        self.names = names
+        lengths = np.fromiter((len(protein) for protein in proteins), dtype=np.int64, count=len(proteins))
+        columns = ProteinBatch.aaColumns[np.frombuffer(b''.join(proteins), dtype=np.uint8)]
+        rows = np.repeat(np.arange(len(proteins)), lengths)
+        self.counts = np.bincount(rows * 21 + columns, minlength=len(proteins) * 21).reshape(-1, 21)[:, :20]
+
+    @classmethod
+    def fromFasta (cls, fileName=None):
+        ''' Read every protein of a FastA file (stdin when fileName is None), named by their headers. '''
+        names, proteins = [], []
+        for header, protein in FastAreader(fileName).readFasta():
+            names.append(header)
+            proteins.append(protein)
+        return cls(proteins, names)
+
+    def __len__ (self):
+        return len(self.counts)
+
+    def aaCount (self):
+        ''' The number of valid amino acids of every protein. '''
+        return self.counts.sum(axis=1)
+
+    def aaComposition (self):
+        ''' The (N x 20) amino acid count matrix, columns in aaOrder. '''
+        return self.counts
+
+    def molecularWeight (self):
+        ''' Sum of the amino acid weights minus the water released by every peptide bond. The weights are added one column at a time
+        in aa_dict order, like ProteinParam.molecularWeight, because a different order can change the last digit of weights that end in 5. '''
+        weight = np.zeros(len(self.counts))
+        for column, aa in enumerate(ProteinBatch.aaOrder):
+            weight += ProteinParam.aa2mw[aa] * self.counts[:, column]
+        count = self.aaCount()
+        return np.where(count > 0, weight - (count - 1) * ProteinParam.mwH2O, 0.0)
+
+    def molarExtinction (self, Cystine=True):
+        ''' Absorbance at 280 nm from the tyrosine, tryptophan and (with Cystine) cysteine counts. '''
+        absorbance = np.array([ProteinParam.aa2abs280.get(aa, 0) if Cystine or aa != 'C' else 0 for aa in ProteinBatch.aaOrder])
+        return self.counts @ absorbance
+
+    def massExtinction (self, Cystine=True):
+        ''' Molar extinction divided by the molecular weight, 0 for a protein without weight. '''
+        weight = self.molecularWeight()
+        return np.divide(self.molarExtinction(Cystine), weight, out=np.zeros(len(weight)), where=weight != 0)
+
+    def ionizableCounts (self):
+        ''' The (N x 7) counts of the ionizable amino acids, columns in the order of ProteinParam.ionizable. '''
+        return self.counts[:, [ProteinBatch.aaOrder.index(aa) for aa in ProteinParam.ionizable]]
+
+    @staticmethod
+    def chargeSlope (counts, pH):
+        ''' ProteinParam.chargeSlope for the rows of an (N x 7) ionizable count matrix, at one pH per row. '''
+        H = 10.0 ** pH
+        nterm, cterm = ProteinParam.ntermPower, ProteinParam.ctermPower
+        charge = nterm / (nterm + H) - H / (cterm + H)
+        slope = nterm / (nterm + H) ** 2 + cterm / (cterm + H) ** 2
+        positive = len(ProteinParam.posPowers)
+        for column, power in enumerate(ProteinParam.posPowers + ProteinParam.negPowers):
+            if column < positive:
+                charge = charge + counts[:, column] * power / (power + H)
+            else:
+                charge = charge - counts[:, column] * H / (power + H)
+            slope = slope + counts[:, column] * power / (power + H) ** 2
+        return charge, -2.302585092994046 * H * slope
+
+    @staticmethod
+    def chargeMatrix (counts, ph_grid):
+        ''' Net charge of every row of an (N x 7) ionizable count matrix at every pH of ph_grid, an (N x grid shape) array.
+        Every ionizable group adds one broadcast (N x 1) * (grid) term, so no python loop runs over the proteins or the pH values. '''
+        H = 10.0 ** np.asarray(ph_grid, dtype=float)
+        counts = np.asarray(counts).reshape(len(counts), 7, *([1] * H.ndim))
+        nterm, cterm = ProteinParam.ntermPower, ProteinParam.ctermPower
+        charge = np.broadcast_to(nterm / (nterm + H) - H / (cterm + H), (len(counts),) + H.shape).copy()
+        positive = len(ProteinParam.posPowers)
+        for column, power in enumerate(ProteinParam.posPowers + ProteinParam.negPowers):
+            if column < positive:
+                charge += counts[:, column] * (power / (power + H))
+            else:
+                charge -= counts[:, column] * (H / (power + H))
+        return charge
+
+    def charge_curve (self, ph_grid):
+        ''' The titration curves of all proteins: an (N x len(ph_grid)) matrix of net charges, row i for protein i. '''
+        return self.chargeMatrix(self.ionizableCounts(), ph_grid)
+
+    def _charge_ (self, pH):
+        ''' Net charge of every protein at pH, a number or one pH per protein. '''
+        return self.chargeSlope(self.ionizableCounts(), np.broadcast_to(np.asarray(pH, dtype=float), (len(self.counts),)))[0]
+
+    @classmethod
+    def solveCharge (cls, counts):
+        ''' ProteinParam.solveCharge for every row of an (N x 7) ionizable count matrix at once, inf where the charge has no zero in 0-14. '''
+        rows = len(counts)
+        outside = (cls.chargeSlope(counts, np.zeros(rows))[0] < 0) | (cls.chargeSlope(counts, np.full(rows, 14.0))[0] > 0)
+        low, high, root = np.zeros(rows), np.full(rows, 14.0), np.full(rows, 7.0)
+        active = ~outside
+        for step in range(200):
+            if not active.any():
+                break
+            charge, slope = cls.chargeSlope(counts[active], root[active])
+            low[active] = np.where(charge >= 0, root[active], low[active])
+            high[active] = np.where(charge <= 0, root[active], high[active])
+            newton = root[active] - charge / slope
+            last = root[active]
+            # a Newton step below the float resolution of the pH ends the search of that row
+            done = (charge == 0) | (np.abs(newton - last) < 1e-13) | (high[active] - low[active] < 1e-13)
+            inside = (newton > low[active]) & (newton < high[active])
+            within = (newton >= low[active]) & (newton <= high[active])
+            root[active] = np.where(done, np.where(within & (charge != 0), newton, last), np.where(inside, newton, (low[active] + high[active]) / 2))
+            active[active] = ~done
+        return np.where(outside, np.inf, root)
+
+    def pI (self, precision=2):
+        ''' ProteinParam.pI for every protein: the zero charge pH of every distinct ionizable count row is solved once, then the binary
+        search of ProteinParam.bisectTo is replayed for all proteins together. '''
+        counts, inverse = np.unique(self.ionizableCounts(), axis=0, return_inverse=True)
+        root = self.solveCharge(counts)[inverse.reshape(-1)]
+        low = np.zeros(len(root))
+        high = np.full(len(root), 14.0)
+        prec = 10 ** (-precision)
+        result = np.zeros(len(root))
+        active = high - low > prec
+        while active.any():
+            middle = (low + high) / 2
+            # the charge is exactly zero in the middle
+            zero = active & (middle == root)
+            result[zero] = middle[zero]
+            low = np.where(active & (middle < root), middle, low)
+            high = np.where(active & (middle > root), middle, high)
+            finished = active & ~zero & (high - low <= prec)
+            result[finished] = ((high + low) / 2)[finished]
+            active &= ~(zero | finished)
+        # python round, exactly like ProteinParam
+        return np.array([round(value, precision) for value in result.tolist()])
 
 
 # Please do not modify any of the following.  This will produce a standard output that can be parsed
     
 import sys
-def main():
+def interactive():
+    ''' The original ProteinParam prompt: one protein per input() line, every metric printed until an empty line. '''
     inString = input('protein sequence?')
     while inString :
         myParamMaker = ProteinParam(inString)
@@ -295,8 +485,207 @@ def main():
     
         inString = input('protein sequence?')
 
-if __name__ == "__main__":
-    main()
+def readProteins (fileName=None, blockSize=1 << 20):
+    ''' Yield the (name, protein) pairs of a protein FastA file, or of a file with one protein per line (named by their line number).
+    The format is recognized from the first character. stdin is read when fileName is None, and either format is read in blocks of blockSize.
+    Both are parsed from the one open handle, because a gzip stream on stdin can not be opened a second time. '''
+    reader = FastAreader(fileName)
+    fileH = reader.doOpen('rb')
+    try:
+        # every binary stream doOpen returns is buffered, a peek finds the first character without using it up
+        isFasta = fileH.peek(blockSize).lstrip()[:1] == b'>'
+        lineNumber = 0
+        # the current FastA header and its sequence lines. lines before the first header are skipped, like readFasta
+        header, parts = None, []
+        while True:
+            lines = fileH.readlines(blockSize)
+            if not lines:
+                break
+            for line in lines:
+                lineNumber += 1
+                if not isFasta:
+                    protein = line.strip()
+                    if protein:
+                        yield str(lineNumber), protein.decode('latin-1')
+                elif line.startswith(b'>'):
+                    if header is not None:
+                        yield reader._record(header, parts)
+                    header, parts = line[1:], []
+                elif header is not None:
+                    parts.append(line)
+        if header is not None:
+            yield reader._record(header, parts)
+    finally:
+        if fileName is not None:
+            fileH.close()
+
+def proteinRows (names, proteins, delimiter='\t'):
+    ''' The table rows of a chunk of proteins, as one str: name, aaCount, molecularWeight, molarExtinction, massExtinction, pI and the
+    fraction of every amino acid in alphabetical order. With numpy the chunk is one ProteinBatch, otherwise every protein gets a ProteinParam.
+    Runs in the worker processes of main. '''
+    # the composition columns are printed alphabetically, like the interactive output
+    order = sorted(ProteinParam.aaOrder)
+    if np is not None:
+        batch = ProteinBatch(proteins)
+        counts = batch.aaCount()
+        composition = batch.aaComposition()[:, [ProteinParam.aaIndex[aa] for aa in order]] / np.maximum(counts, 1)[:, None]
+        metrics = zip(counts.tolist(), batch.molecularWeight().tolist(), batch.molarExtinction().tolist(),
+                      batch.massExtinction().tolist(), batch.pI().tolist(), composition.tolist())
+    else:
+        metrics = []
+        for protein in proteins:
+            param = ProteinParam(protein)
+            count = param.aaCount()
+            # handles the case where no AA are present, like the interactive output
+            total = count or 1
+            aaCounts = param.aaComposition()
+            metrics.append((count, param.molecularWeight(), param.molarExtinction(), param.massExtinction(), param.pI(),
+                            [aaCounts[aa] / total for aa in order]))
+    # one format call per row, the same precision as the interactive output
+    rowFormat = delimiter.join(['{}', '{}', '{:.1f}', '{:.2f}', '{:.2f}', '{:.2f}'] + ['{:.4f}'] * len(order)) + '\n'
+    rows = []
+    for name, (count, weight, molar, mass, pI, fractions) in zip(names, metrics):
+        # the name is the first word of the header, so it has no whitespace. csv quotes it when it holds a comma or a quote
+        name = name.split()[0] if name.split() else name
+        if delimiter in name or '"' in name:
+            name = '"' + name.replace('"', '""') + '"'
+        rows.append(rowFormat.format(name, count, weight, molar, mass, pI, *fractions))
+    return ''.join(rows)
+
+def main(inOpts=None):
+    '''
+    Characterize every protein of a FastA or one protein per line file (stdin by default) and write one TSV or CSV table of the metrics
+    and the composition. Chunks of proteins are characterized by a process pool and written in input order.
+    -i runs the original interactive prompt instead.
+    '''
+    import argparse
+    from collections import deque
+    parser = argparse.ArgumentParser(description = 'Molecular weight, extinction, pI and amino acid composition of proteins',
+                                     usage = '%(prog)s [options] [proteins.fa] >output')
+    parser.add_argument('input', nargs='?', default=None, help='protein FastA or one protein per line, stdin by default')
+    parser.add_argument('-i', '--interactive', action='store_true', default=False, help='prompt for one protein at a time, the original output')
+    parser.add_argument('-f', '--format', choices=('tsv', 'csv'), default='tsv', help='table format')
+    parser.add_argument('-o', '--output', default=None, help='file to write the table to, stdout by default')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of processes that characterize chunks at the same time')
+    parser.add_argument('--chunk', type=int, default=10000, help='proteins per chunk')
+    args = parser.parse_args(inOpts)
+
+    if args.interactive:
+        interactive()
+        return
+
+    delimiter = '\t' if args.format == 'tsv' else ','
+    out = sys.stdout if args.output is None else open(args.output, 'w', buffering=1 << 20, newline='')
+    header = ['name', 'aaCount', 'molecularWeight', 'molarExtinction', 'massExtinction', 'pI'] + sorted(ProteinParam.aaOrder)
+    out.write(delimiter.join(header) + '\n')
+
+    def chunks():
+        # (names, proteins) lists of up to args.chunk proteins
+        names, proteins = [], []
+        for name, protein in readProteins(args.input):
+            names.append(name)
+            proteins.append(protein)
+            if len(proteins) == args.chunk:
+                yield names, proteins
+                names, proteins = [], []
+        if proteins:
+            yield names, proteins
+
+    if args.jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        # only a few chunks per process are in flight, so a big file is not read ahead into memory
+        pending = deque()
+        with ProcessPoolExecutor(args.jobs) as pool:
+            for names, proteins in chunks():
+                pending.append(pool.submit(proteinRows, names, proteins, delimiter))
+                while len(pending) > 2 * args.jobs:
+                    out.write(pending.popleft().result())
+            while pending:
+                out.write(pending.popleft().result())
+    else:
+        for names, proteins in chunks():
+            out.write(proteinRows(names, proteins, delimiter))
+
+    if out is sys.stdout:
+        out.flush()
+    else:
+        out.close()
+
+from collections import Counter
+try:
+    import numpy as np
+except ImportError:
+    # without numpy, NucParams counts with the pure python path in addSequence
+    np = None
+class Sequence :
+    ''' One sequence record, held once as bytes, with the encodings the engines use built on first use and then kept:
+        codes(): numpy base codes, A C G T = 0-3, a c g t, U and u = 4-7, anything else 8
+        reverseComplement(): the reverse complement bytes, from one bytes.translate
+        rna(): the uppercase RNA spelling used by the plain python NucParams
+        codonIndex(strand, strict): the codon index 16*a + 4*b + c of the codon at every position, on either strand
+    OrfFinder, NucParams and the ORF translation all take a Sequence, so a genome is encoded once however many of them read it.
+    '''
+    # tables that complement the upper case bases and turn a sequence into upper case RNA
+    compTrans = bytes.maketrans(b"ATGC", b"TACG")
+    rnaTrans = bytes.maketrans(b'acgtuT', b'ACGUUU')
+    # byte -> base code, built on first use. codes 4-7 are the bases only the lenient (NucParams) reading accepts
+    baseCodes = None
+
+    def __init__ (self, seq):
+        self.data = seq.encode('ascii', 'replace') if isinstance(seq, str) else bytes(seq)
+        self.cache = {}
+
+    def __len__ (self):
+        return len(self.data)
+
+    def __getitem__ (self, key):
+        return self.data[key]
+
+    def __bytes__ (self):
+        return self.data
+
+    def codes (self):
+        ''' The base code array of the sequence. '''
+        if 'codes' not in self.cache:
+            if Sequence.baseCodes is None:
+                table = np.full(256, 8, dtype=np.uint8)
+                for code, bases in enumerate(('A', 'C', 'G', 'T', 'a', 'c', 'g', 'tUu')):
+                    for base in bases:
+                        table[ord(base)] = code
+                Sequence.baseCodes = table
+            self.cache['codes'] = Sequence.baseCodes[np.frombuffer(self.data, dtype=np.uint8)]
+        return self.cache['codes']
+
+    def reverseComplement (self):
+        ''' The reverse complement, upper case bases only, like OrfFinder.reverseComp. '''
+        if 'reverse' not in self.cache:
+            self.cache['reverse'] = self.data[::-1].translate(Sequence.compTrans)
+        return self.cache['reverse']
+
+    def rna (self):
+        ''' The sequence in upper case with T turned into U. '''
+        if 'rna' not in self.cache:
+            self.cache['rna'] = self.data.translate(Sequence.rnaTrans)
+        return self.cache['rna']
+
+    def codonIndex (self, strand='+', strict=False):
+        ''' The codon index of every position 0 .. len - 3. strand '-' gives the index of the reverse complement codon at each top strand position.
+        strict only reads upper case A, C, G and T (like OrfFinder), otherwise case is ignored and U counts as T (like NucParams).
+        A codon with any other base gets an index past 63. Take [frame::3] for the codons of one frame. '''
+        key = ('index', strand, strict)
+        if key not in self.cache:
+            codes = self.codes()
+            bases = np.where(codes < (4 if strict else 8), codes & 3, 64).astype(np.uint16)
+            if len(bases) < 3:
+                index = np.zeros(0, dtype=np.uint16)
+            elif strand == '+':
+                index = 16 * bases[:-2] + 4 * bases[1:-1] + bases[2:]
+            else:
+                # the complement of code x is 3 - x, and the reverse complement reads the bases backwards
+                comp = np.where(bases < 4, 3 - bases, 64)
+                index = 16 * comp[2:] + 4 * comp[1:-1] + comp[:-2]
+            self.cache[key] = index
+        return self.cache[key]
 
 class NucParams:
     rnaCodonTable = {
@@ -323,6 +712,15 @@ class NucParams:
     'GUG': 'V', 'GCG': 'A', 'GAG': 'E', 'GGG': 'G'  # GxG
     }
     dnaCodonTable = {key.replace('U','T'):value for key, value in rnaCodonTable.items()}
+    # tables used by addSequence to uppercase a sequence and turn T into U in a single translate call
+    rnaTrans = str.maketrans('acgtuT', 'ACGUUU')
+    rnaBytesTrans = bytes.maketrans(b'acgtuT', b'ACGUUU')
+    # maps the str and the bytes spelling of every codon to its key in rnaCodonTable
+    rnaCodonKeys = {**{key: key for key in rnaCodonTable}, **{key.encode(): key for key in rnaCodonTable}}
+    # addSequence uses the numpy engine whenever numpy is installed. set to False to count in plain python
+    useNumpy = np is not None
+    # lookup tables of the numpy engine, built by _numpyTables the first time they are needed
+    baseCodes = None
 
     def __init__ (self, inString=''):
         ''' Create empty dictionaries for the allowed nucleotides, codon keys (3-base), and codon values (1-letter). '''
@@ -339,31 +737,127 @@ class NucParams:
         for i in NucParams.rnaCodonTable.values():
             self.aaComp[i] = 0
 
+        # bases after the last whole codon of the chunk given to feed, put in front of the next chunk
+        self.carry = None
+
+    @classmethod
+    def _numpyTables (cls):
+        ''' Build the lookup tables of the numpy engine: a byte -> base code table, the codon names in code order and the 64 -> 21 codon to amino acid matrix. '''
+        # A, C, G and U/T (either case) get the codes 0-3. every other byte gets 64, which pushes any codon holding it past index 63
+        baseCodes = np.full(256, 64, dtype=np.uint16)
+        for code, bases in enumerate(('Aa', 'Cc', 'Gg', 'UuTt')):
+            for base in bases:
+                baseCodes[ord(base)] = code
+        # codon index 16*first + 4*second + third names the codons in this order
+        cls.codonOrder = [a + b + c for a in 'ACGU' for b in 'ACGU' for c in 'ACGU']
+        cls.aaOrder = list(dict.fromkeys(cls.rnaCodonTable.values()))
+        cls.codonToAa = np.zeros((64, len(cls.aaOrder)), dtype=np.int64)
+        for index, codon in enumerate(cls.codonOrder):
+            cls.codonToAa[index, cls.aaOrder.index(cls.rnaCodonTable[codon])] = 1
+        cls.baseCodes = baseCodes
+
+    def _addSequenceNumpy (self, inSeq):
+        ''' numpy engine for addSequence: byte counts from one bincount, codon counts from a vectorized 16*a + 4*b + c index, amino acids from a matrix product. '''
+        if NucParams.baseCodes is None:
+            NucParams._numpyTables()
+        # a str is turned into bytes, any non ascii character becomes '?' so the positions stay the same
+        if isinstance(inSeq, str):
+            inSeq = inSeq.encode('ascii', 'replace')
+        raw = np.frombuffer(inSeq.data if isinstance(inSeq, Sequence) else inSeq, dtype=np.uint8)
+
+        # the nucleotides are counted case sensitive, exactly like the dictionary lookups of the python path
+        byteCounts = np.bincount(raw, minlength=256)
+        for nuc in self.nucComp:
+            self.nucComp[nuc] += int(byteCounts[ord(nuc)])
+
+        if isinstance(inSeq, Sequence):
+            # the whole codons are every third codon of the cached index
+            index = inSeq.codonIndex()[0::3]
+        else:
+            # ignore the incomplete/lagging codon at the end and give every whole codon its index
+            codes = NucParams.baseCodes[raw[:len(raw) // 3 * 3]].reshape(-1, 3)
+            index = 16 * codes[:, 0] + 4 * codes[:, 1] + codes[:, 2]
+        # indexes past 63 hold a base that is not A, C, G or U (like N) and are dropped
+        codonCounts = np.bincount(index, minlength=64)[:64]
+        aaCounts = codonCounts @ NucParams.codonToAa
+
+        for codon, count in zip(NucParams.codonOrder, codonCounts.tolist()):
+            self.codonComp[codon] += count
+        for aa, count in zip(NucParams.aaOrder, aaCounts.tolist()):
+            self.aaComp[aa] += count
+
     def addSequence (self, inSeq):
-        ''' Find the counts of inSeq nucleotide bases, codons, and codons' AA composition. '''
-        # loop through the nucleotide in inSeq. if nucleotide in self.nucleotide dictionary, increments its count by 1
-        for i in inSeq:
-            if i in self.nucComp:
-                self.nucComp[i] += 1
+        ''' Find the counts of inSeq nucleotide bases, codons, and codons' AA composition. inSeq can be a str, the bytes given by FastAreader(asBytes=True) or a Sequence. '''
+        if NucParams.useNumpy:
+            return self._addSequenceNumpy(inSeq)
+        if isinstance(inSeq, Sequence):
+            # the counts are taken from the bytes, the codons from the cached RNA spelling
+            rna = inSeq.rna()
+            inSeq = inSeq.data
+        else:
+            rna = None
+
+        # bytes and str need their own keys and tables, pick the matching ones once
+        isBytes = isinstance(inSeq, (bytes, bytearray))
+
+        # count every allowed nucleotide with one C level scan of inSeq instead of a python loop over every base
+        for nuc in self.nucComp:
+            self.nucComp[nuc] += inSeq.count(nuc.encode() if isBytes else nuc)
 
         # we are looking at a RNA sequence so all T's need to be replaced by U's
-        # turning all lower case letters into upper case to cross-match with the rnaCodonTable above
-        inSeq = inSeq.upper().replace("T", "U")
+        # turning all lower case letters into upper case to cross-match with the rnaCodonTable above. translate does both in one copy
+        inSeq = rna if rna is not None else inSeq.translate(NucParams.rnaBytesTrans if isBytes else NucParams.rnaTrans)
 
         # ignore incomplete/lagging codon sequences in the end of the sequence. i will increment in counts of 3 after each iteration
-        for i in range(0, len(inSeq), 3):
-            # loop through inSeq and finds each 3-base codon. if codon in self.codon dictionary, increments its count by 1
-            codon = inSeq[i:i+3]
-            if codon in self.codonComp and "N" not in codon:
-                self.codonComp[codon] += 1
-
-            # uses the same parsed codon and finds its amino acid letter. if its aa in self.aa dictionary, increment its count by 1
-            # the codon might not be in rnaCodonTable which is why I have put a parameter None. with this None, it does not assume that the codon is in rnaCodonTable and avoids errors
-            aa = NucParams.rnaCodonTable.get(codon, None)
-            if aa and aa in self.aaComp: # ignores if aa is None. avoids unecessary dictionary lookup
-                self.aaComp[aa] += 1
-        pass
-        
+        # count how often every 3-base slice appears, then add the counts to the codon and amino acid dictionaries once per distinct codon
+        codonCounts = Counter(inSeq[i:i+3] for i in range(0, len(inSeq), 3))
+        for codon, count in codonCounts.items():
+            # the codon might not be in rnaCodonTable (for example it contains an N or is the lagging end), those are ignored
+            codon = NucParams.rnaCodonKeys.get(codon)
+            if codon:
+                self.codonComp[codon] += count
+                self.aaComp[NucParams.rnaCodonTable[codon]] += count
+
+    def feed (self, chunk):
+        ''' Add the next piece of a sequence that is read in chunks. The bases after the last whole codon are carried over to the next chunk,
+        so the codons are framed exactly as if addSequence was given the whole sequence. Call finish at the end of every sequence. '''
+        if self.carry:
+            chunk = self.carry + chunk
+        # only whole codons are counted now
+        cut = len(chunk) // 3 * 3
+        self.addSequence(chunk[:cut])
+        self.carry = chunk[cut:]
+
+    def finish (self):
+        ''' End the sequence given to feed. The 1 or 2 lagging bases still count as nucleotides, but not as a codon. '''
+        carry, self.carry = self.carry, None
+        if carry:
+            self.addSequence(carry)
+
+    def merge (self, other):
+        ''' Add the counts of another NucParams to this one, for example the partial counts of a worker process. Returns self. '''
+        for comp, otherComp in ((self.nucComp, other.nucComp), (self.codonComp, other.codonComp), (self.aaComp, other.aaComp)):
+            for key, count in otherComp.items():
+                comp[key] = comp.get(key, 0) + count
+        return self
+
+    def __add__ (self, other):
+        ''' Return a new NucParams holding the counts of both. '''
+        return NucParams().merge(self).merge(other)
+
+    def toDict (self):
+        ''' Return the counts as plain dictionaries, ready for json. '''
+        return {'nucComp': self.nucComp, 'codonComp': self.codonComp, 'aaComp': self.aaComp}
+
+    @classmethod
+    def fromDict (cls, counts):
+        ''' Make a NucParams holding the counts written by toDict. '''
+        nuc = cls()
+        nuc.nucComp.update(counts['nucComp'])
+        nuc.codonComp.update(counts['codonComp'])
+        nuc.aaComp.update(counts['aaComp'])
+        return nuc
+
     def aaComposition(self):
         ''' Returns the calculated AA composition from above. '''
         return self.aaComp
@@ -377,6 +871,101 @@ class NucParams:
         ''' Returns the sum of the count (values) of all valid nucleotides in inSeq. '''
         return sum(self.nucComp.values())
         
+class CompositionCache :
+    '''
+    On disk cache of the NucParams counts of whole FastA files.
+
+    instantiation:
+    thisCache = CompositionCache()
+    usage:
+    myNuc = thisCache.load('genome.fa', countFile)
+    returns the cached counts when genome.fa was counted before, otherwise calls countFile('genome.fa') and stores its result.
+
+    Entries are named after the sha256 digest and size of the file contents. The digest of a path is remembered together
+    with its size and mtime, so an unchanged file is not hashed again. When the entries grow past maxBytes the least
+    recently used ones are removed.
+    '''
+    # bump when the counting changes, so older entries are not used anymore
+    version = 1
+
+    def __init__ (self, cacheDir=None, maxBytes=64 << 20):
+        '''constructor: saves the cache directory ($SEQUENCE_CACHE or ~/.cache/sequenceAnalysis by default) and the size cap '''
+        import os
+        self.cacheDir = cacheDir or os.environ.get('SEQUENCE_CACHE') or os.path.join(os.path.expanduser('~'), '.cache', 'sequenceAnalysis')
+        self.maxBytes = maxBytes
+
+    def _writeJson (self, path, data):
+        ''' Write data to path through a temporary file, so other processes never see half written files. '''
+        import json, os
+        os.makedirs(self.cacheDir, exist_ok=True)
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp, 'w') as tempH:
+            json.dump(data, tempH)
+        os.replace(temp, path)
+
+    def key (self, fileName):
+        ''' Return the cache key of fileName: the digest and size of its contents. '''
+        import hashlib, json, os
+        stat = os.stat(fileName)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        # path -> [size, mtime, key] of files hashed before
+        digests = os.path.join(self.cacheDir, 'digests.json')
+        try:
+            with open(digests) as digestsH:
+                known = json.load(digestsH)
+        except (OSError, ValueError):
+            known = {}
+        path = os.path.abspath(fileName)
+        if path in known and known[path][:2] == stamp:
+            return known[path][2]
+
+        digest = hashlib.sha256()
+        with open(fileName, 'rb') as fileH:
+            for block in iter(lambda: fileH.read(1 << 20), b''):
+                digest.update(block)
+        key = 'v{}-{}-{}'.format(CompositionCache.version, digest.hexdigest(), stat.st_size)
+        known[path] = stamp + [key]
+        self._writeJson(digests, known)
+        return key
+
+    def get (self, fileName):
+        ''' Return the cached NucParams of fileName, or None when it was not counted before. '''
+        import json, os
+        entry = os.path.join(self.cacheDir, self.key(fileName) + '.json')
+        try:
+            with open(entry) as entryH:
+                counts = json.load(entryH)
+        except (OSError, ValueError):
+            return None
+        # touching the entry marks it as recently used
+        os.utime(entry)
+        return NucParams.fromDict(counts)
+
+    def put (self, fileName, nuc):
+        ''' Store the counts of fileName and remove the least recently used entries while the cache is bigger than maxBytes. '''
+        import os
+        self._writeJson(os.path.join(self.cacheDir, self.key(fileName) + '.json'), nuc.toDict())
+
+        entries = []
+        for name in os.listdir(self.cacheDir):
+            if name.startswith('v') and name.endswith('.json'):
+                stat = os.stat(os.path.join(self.cacheDir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for used, size, name in entries)
+        for used, size, name in sorted(entries):
+            if total <= self.maxBytes:
+                break
+            os.remove(os.path.join(self.cacheDir, name))
+            total -= size
+
+    def load (self, fileName, count):
+        ''' Return the cached counts of fileName, or count it with count(fileName) and store the result. '''
+        nuc = self.get(fileName)
+        if nuc is None:
+            nuc = count(fileName)
+            self.put(fileName, nuc)
+        return nuc
+
 import sys
 class FastAreader :
     ''' 
@@ -387,40 +976,478 @@ class FastAreader :
     usage:
     for head, seq in thisReader.readFasta():
         print (head,seq)
+
+    The file is read in large binary blocks and every record is joined once, so reading time grows
+    linearly with the file size. With asBytes=True the sequences are returned as uppercase bytes,
+    which NucParams.addSequence and OrfFinder accept directly. readChunks returns the records in pieces
+    of about blockSize bases instead, for NucParams.feed.
+
+    random access:
+    thisReader.fetch('chr1', 1000, 2000) returns bases 1000 up to (not including) 2000 of record chr1.
+    It uses a samtools compatible .fai index that is built on first use and saved next to the file.
+
+    memory mapped:
+    for head, seq in thisReader.mapFasta():
+        print (head, len(seq), seq[0:60])
+    Every record is a MappedSequence over one shared read only mmap of the file, so nothing is copied until bases are used.
+
+    compressed files:
+    gzip and BGZF (bgzip) files are recognized by their first bytes and read without unpacking them to disk first.
+    BGZF blocks are decompressed in parallel by a BgzfReader, which can also seek, so fetch works on BGZF files too.
     '''
-    def __init__ (self, fname=None):
-        '''contructor: saves attribute fname '''
+    # whitespace removed from sequence lines, same set that str.split() drops
+    whitespace = b' \t\n\r\x0b\x0c'
+
+    def __init__ (self, fname=None, asBytes=False, blockSize=1 << 20, threads=None):
+        '''contructor: saves attribute fname, the output type, the size of the blocks read from the file and the number of BGZF decompression threads '''
         self.fname = fname
+        self.asBytes = asBytes
+        self.blockSize = blockSize
+        self.threads = threads
+        # name -> (length, offset, lineBases, lineWidth), filled by loadIndex
+        self.index = None
             
-    def doOpen (self):
-        ''' Handle file opens, allowing STDIN.'''
+    def compression (self):
+        ''' Return 'bgzf', 'gzip' or None for fname, recognized from the magic bytes at the start of the file. '''
         if self.fname is None:
-            return sys.stdin
+            return None
+        with open(self.fname, 'rb') as fileH:
+            magic = fileH.read(18)
+        if not magic.startswith(b'\x1f\x8b'):
+            return None
+        # BGZF is gzip with the FEXTRA flag and a 'BC' extra field holding the block size
+        return 'bgzf' if len(magic) == 18 and magic[3] & 4 and magic[12:14] == b'BC' else 'gzip'
+            
+    def doOpen (self, mode='r'):
+        ''' Handle file opens, allowing STDIN. gzip and BGZF files are decompressed on the fly.'''
+        import gzip
+        if self.fname is None:
+            # the binary modes need the raw buffer underneath sys.stdin
+            if 'b' not in mode:
+                return sys.stdin
+            if sys.stdin.buffer.peek(2)[:2] == b'\x1f\x8b':
+                return gzip.GzipFile(fileobj=sys.stdin.buffer)
+            return sys.stdin.buffer
+
+        compression = self.compression()
+        if compression == 'bgzf':
+            fileH = io.BufferedReader(BgzfReader(self.fname, self.threads), self.blockSize)
+        elif compression == 'gzip':
+            fileH = gzip.open(self.fname, 'rb')
         else:
-            return open(self.fname)
+            return open(self.fname, mode)
+        return fileH if 'b' in mode else io.TextIOWrapper(fileH)
+
+    def _record (self, header, parts):
+        ''' Join the collected sequence fragments of one record, drop whitespace and uppercase it in a single pass. '''
+        sequence = b''.join(parts).translate(None, FastAreader.whitespace).upper()
+        if not self.asBytes:
+            sequence = sequence.decode('latin-1')
+        return header.rstrip().decode(), sequence
         
+    def mapFasta (self, names=None):
+        ''' Memory map the file and return the header and a MappedSequence of every record, or only of the named records. 
+        The index gives the line layout used to skip the newlines. '''
+        import mmap
+        if self.compression() is not None:
+            raise ValueError('{} is compressed and can not be memory mapped, use readFasta or fetch instead'.format(self.fname))
+        index = self.loadIndex()
+        with self.doOpen('rb') as fileH:
+            # the map stays valid after the file is closed. it is read only, so processes mapping the same file share its pages
+            mapped = mmap.mmap(fileH.fileno(), 0, access=mmap.ACCESS_READ)
+
+        for name in (index if names is None else names):
+            length, offset, lineBases, lineWidth = index[name]
+            # the header line ends right before the first base, look back for its '>'
+            headStart = mapped.rfind(b'\n>', 0, offset - 1) + 1
+            header = mapped[headStart + 1:offset].rstrip().decode()
+            yield header, MappedSequence(mapped, offset, length, lineBases, lineWidth)
+
+    def readRecords (self, names):
+        ''' Return the name/sequence of the named records only, read with fetch instead of streaming the whole file. '''
+        for name in names:
+            yield name, self.fetch(name)
+
+    def _scan (self, start=None, end=None):
+        ''' Walk the file in blocks. yields (header, None) for every header line and (None, part) for the raw sequence lines of the current record.
+        start and end limit the walk to that byte range of the file. '''
+        # nothing is yielded until the first fasta header is found, so anything before it is skipped
+        inRecord = False
+
+        with self.doOpen('rb') as fileH:
+            if start:
+                fileH.seek(start)
+            # bytes left to read in the range, None reads to the end of the file
+            left = None if end is None else end - (start or 0)
+            tail = b''
+            # True when the previous block ended in the middle of a sequence line
+            midLine = False
+            while True:
+                block = fileH.read(self.blockSize if left is None else min(self.blockSize, left))
+                if left is not None:
+                    left -= len(block)
+                # at the end of the file finish the last line, even if it has no newline
+                if not block:
+                    if not tail:
+                        break
+                    block = b'\n'
+                buf = tail + block
+                pos = 0
+                if midLine:
+                    # the start of this block continues the sequence line cut off by the previous block
+                    pos = buf.find(b'\n') + 1 or len(buf)
+                    if inRecord:
+                        yield None, buf[:pos]
+                    midLine = pos == len(buf) and not buf.endswith(b'\n')
+                # only whole lines are handled here, the partial last line is carried over to the next block
+                end = max(buf.rfind(b'\n') + 1, pos)
+                tail = buf[end:]
+
+                while pos < end:
+                    if buf[pos] == 62: # '>' starts a header line
+                        eol = buf.find(b'\n', pos)
+                        inRecord = True
+                        yield buf[pos + 1:eol], None
+                        pos = eol + 1
+                    else:
+                        # everything up to the next header line belongs to the current sequence
+                        nxt = buf.find(b'\n>', pos, end)
+                        nxt = end if nxt == -1 else nxt + 1
+                        if inRecord:
+                            yield None, buf[pos:nxt]
+                        pos = nxt
+
+                # a partial sequence line is handed over right away so very long lines are never copied twice
+                if tail and tail[0] != 62:
+                    if inRecord:
+                        yield None, tail
+                    tail = b''
+                    midLine = True
+
     def readFasta (self):
         ''' Read an entire FastA record and return the sequence header/sequence'''
-        header = ''
-        sequence = ''
-        
-        with self.doOpen() as fileH:
-            
-            header = ''
-            sequence = ''
-            
-            # skip to first fasta header
-            line = fileH.readline()
-            while not line.startswith('>') :
-                line = fileH.readline()
-            header = line[1:].rstrip()
+        header = None
+        parts = []
+        for head, part in self._scan():
+            if head is not None:
+                if header is not None:
+                    yield self._record(header, parts)
+                header = head
+                parts = []
+            else:
+                parts.append(part)
+
+        if header is not None:
+            yield self._record(header, parts)
+
+    def readChunks (self, start=None, end=None):
+        ''' Return the file as (header, chunk) pieces of about blockSize bases, so a record never has to be held in memory as a whole.
+        The first chunk of every record carries its header (and may be empty), the chunks after it have None as header.
+        start and end limit reading to a byte range, like the ones from splitRanges. '''
+        for head, part in self._scan(start, end):
+            if head is not None:
+                yield head.rstrip().decode(), b'' if self.asBytes else ''
+            else:
+                chunk = part.translate(None, FastAreader.whitespace).upper()
+                yield None, chunk if self.asBytes else chunk.decode('latin-1')
 
+    def splitRanges (self, parts):
+        ''' Cut the file into about parts byte ranges (start, end) that each begin at a header line, so every record lies in exactly one range. '''
+        if self.fname is None or self.compression() == 'gzip':
+            raise ValueError('only uncompressed or BGZF files can be split into byte ranges')
+        with self.doOpen('rb') as fileH:
+            size = fileH.seek(0, io.SEEK_END)
+            bounds = [0]
+            for part in range(1, parts):
+                pos = max(size * part // parts, bounds[-1])
+                # move forward to the next line that starts with '>', looking from the byte before pos in case pos is already on one
+                fileH.seek(max(pos - 1, 0))
+                while True:
+                    block = fileH.read(1 << 16)
+                    found = block.find(b'\n>')
+                    if found != -1:
+                        pos = fileH.tell() - len(block) + found + 1
+                        break
+                    if len(block) < 1 << 16:
+                        pos = size
+                        break
+                    # step back one byte, a newline at the end could pair with a '>' at the start of the next block
+                    fileH.seek(-1, io.SEEK_CUR)
+                if pos >= size:
+                    break
+                bounds.append(pos)
+            bounds.append(size)
+        return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+    def buildIndex (self):
+        ''' Scan the file once and write the samtools style index (name, length, offset, line bases, line width) to fname.fai. '''
+        if self.fname is None:
+            raise ValueError('a FastA index needs a file name, STDIN can not be indexed')
+        index = {}
+        with self.doOpen('rb') as fileH:
+            # offset is the byte position of the current line in the file
+            offset = 0
+            name = None
             for line in fileH:
-                if line.startswith ('>'):
-                    yield header,sequence
-                    header = line[1:].rstrip()
-                    sequence = ''
-                else :
-                    sequence += ''.join(line.rstrip().split()).upper()
-
-        yield header,sequence
+                if line.startswith(b'>'):
+                    # the record name is the first word of the header
+                    name = line[1:].split(maxsplit=1)[0].decode() if line[1:].strip() else ''
+                    if name in index:
+                        raise ValueError('duplicate FastA record name: {}'.format(name))
+                    # [length, offset of the first base, bases per line, bytes per line]
+                    index[name] = [0, offset + len(line), 0, 0]
+                    # set once a line shorter than the others is seen, only the last line of a record may be short
+                    done = False
+                elif name is not None:
+                    bases = len(line.rstrip(b'\r\n'))
+                    record = index[name]
+                    if not bases:
+                        # a blank line ends the sequence lines of the record
+                        done = True
+                    elif done or bases > record[2] > 0 or (bases == record[2] and line.endswith(b'\n') and len(line) != record[3]):
+                        raise ValueError('FastA record {} has lines of different lengths and can not be indexed'.format(name))
+                    elif record[2] == 0:
+                        record[2], record[3] = bases, len(line)
+                    elif bases < record[2]:
+                        done = True
+                    record[0] += bases
+                offset += len(line)
+
+        try:
+            with open(self.fname + '.fai', 'w') as faiH:
+                for name, (length, start, lineBases, lineWidth) in index.items():
+                    faiH.write('{}\t{}\t{}\t{}\t{}\n'.format(name, length, start, lineBases, lineWidth))
+        except OSError:
+            # the index file is only a shortcut, in a read only directory the index is kept in memory and rebuilt next time
+            pass
+        self.index = {name: tuple(record) for name, record in index.items()}
+        return self.index
+
+    def loadIndex (self):
+        ''' Read fname.fai, building it first when it is missing or older than the FastA file. '''
+        import os
+        if self.compression() == 'gzip':
+            raise ValueError('{} is plain gzip and can not be read at random positions, compress it with bgzip instead'.format(self.fname))
+        if self.index is None:
+            fai = self.fname + '.fai' if self.fname is not None else None
+            if fai is None or not os.path.exists(fai) or os.path.getmtime(fai) < os.path.getmtime(self.fname):
+                return self.buildIndex()
+            self.index = {}
+            with open(fai) as faiH:
+                for line in faiH:
+                    name, length, start, lineBases, lineWidth = line.rstrip('\n').split('\t')[:5]
+                    self.index[name] = (int(length), int(start), int(lineBases), int(lineWidth))
+        return self.index
+
+    def fetch (self, name, start=None, end=None):
+        ''' Return bases start up to end (0-based, end excluded, like a python slice) of record name, seeking straight to them with the index. '''
+        if name not in self.loadIndex():
+            raise KeyError('no FastA record named {}'.format(name))
+        length, offset, lineBases, lineWidth = self.index[name]
+        # clamp the requested range to the record
+        start = 0 if start is None else min(max(start, 0), length)
+        end = length if end is None else min(max(end, start), length)
+
+        sequence = b''
+        if start < end:
+            # turn base positions into byte positions, every full line adds lineWidth bytes
+            first = offset + start // lineBases * lineWidth + start % lineBases
+            last = offset + (end - 1) // lineBases * lineWidth + (end - 1) % lineBases + 1
+            with self.doOpen('rb') as fileH:
+                fileH.seek(first)
+                sequence = fileH.read(last - first).translate(None, FastAreader.whitespace).upper()
+        return sequence if self.asBytes else sequence.decode('latin-1')
+
+class MappedSequence :
+    ''' 
+    One FastA record inside a memory mapped file, made by FastAreader.mapFasta.
+
+    usage:
+    len(seq) is the number of bases, seq[a:b] returns the uppercase bytes of bases a up to b without newlines,
+    bytes(seq) returns the whole record and seq.chunks(size) walks it in blocks of size bases.
+    Only the part that is asked for is copied out of the map.
+    '''
+    def __init__ (self, mapped, offset, length, lineBases, lineWidth):
+        '''constructor: saves the map and the layout of the record taken from the .fai index '''
+        self.mapped = mapped
+        self.offset = offset
+        self.length = length
+        self.lineBases = lineBases
+        self.lineWidth = lineWidth
+
+    def __len__ (self):
+        return self.length
+
+    def _bytePos (self, pos):
+        ''' Position of base pos in the file. every full line before it adds lineWidth bytes. '''
+        return self.offset + pos // self.lineBases * self.lineWidth + pos % self.lineBases
+
+    def __getitem__ (self, key):
+        ''' Return the bases of the slice key as uppercase bytes with the newlines dropped. '''
+        if not isinstance(key, slice) or key.step not in (None, 1):
+            raise TypeError('MappedSequence only supports slices with step 1')
+        start, end, step = key.indices(self.length)
+        if start >= end:
+            return b''
+        raw = self.mapped[self._bytePos(start):self._bytePos(end - 1) + 1]
+        return raw.translate(None, FastAreader.whitespace).upper()
+
+    def __bytes__ (self):
+        return self[:]
+
+    @property
+    def raw (self):
+        ''' Zero copy memoryview of the record as it is stored in the file, newlines included. '''
+        return memoryview(self.mapped)[self.offset:self._bytePos(self.length - 1) + 1 if self.length else self.offset]
+
+    def chunks (self, size=1 << 20):
+        ''' Return the record as consecutive blocks of size bases, so a whole chromosome never has to be copied at once. '''
+        for start in range(0, self.length, size):
+            yield self[start:start + size]
+
+import io
+class BgzfReader (io.RawIOBase) :
+    ''' 
+    Read a BGZF (bgzip) file as if it were not compressed, made by FastAreader.doOpen.
+
+    BGZF is a series of small gzip blocks. The start of every block is kept in a table that is saved
+    as a samtools compatible fname.gzi, so seek can jump to any uncompressed position. While the file
+    is read in order, the next blocks are decompressed ahead of time on a thread pool (zlib releases the GIL).
+    '''
+    def __init__ (self, fname, threads=None, readAhead=None):
+        '''constructor: opens fname, loads the block table and starts the decompression threads '''
+        import os
+        from concurrent.futures import ThreadPoolExecutor
+        super().__init__()
+        self.fname = fname
+        self.fd = os.open(fname, os.O_RDONLY)
+        threads = threads or os.cpu_count()
+        self.pool = ThreadPoolExecutor(threads)
+        # how many blocks are decompressed ahead of a sequential reader
+        self.readAhead = readAhead or 4 * threads
+        # block number -> future of its decompressed data
+        self.pending = {}
+        # (block number, data) of the block the reader is in
+        self.current = None
+        self.lastBlock = -1
+        self.pos = 0
+        self.loadBlocks()
+
+    def loadBlocks (self):
+        ''' Fill the compressed and uncompressed start of every block, from fname.gzi when it is up to date, otherwise by walking the block headers. '''
+        import os, struct
+        gzi = self.fname + '.gzi'
+        fileSize = os.fstat(self.fd).st_size
+        if os.path.exists(gzi) and os.path.getmtime(gzi) >= os.path.getmtime(self.fname):
+            with open(gzi, 'rb') as gziH:
+                count, = struct.unpack('<Q', gziH.read(8))
+                pairs = struct.unpack('<{}Q'.format(2 * count), gziH.read(16 * count))
+            # the .gzi leaves out the first block, which always starts at 0, 0
+            offsets = [(0, 0)] + list(zip(pairs[0::2], pairs[1::2]))
+        else:
+            offsets = []
+            cPos = uPos = 0
+            while cPos < fileSize:
+                offsets.append((cPos, uPos))
+                blockSize, inflatedSize = self._blockSizes(cPos)
+                cPos += blockSize
+                uPos += inflatedSize
+            offsets = offsets or [(0, 0)]
+            try:
+                with open(gzi, 'wb') as gziH:
+                    gziH.write(struct.pack('<Q', len(offsets) - 1))
+                    for pair in offsets[1:]:
+                        gziH.write(struct.pack('<QQ', *pair))
+            except OSError:
+                # the table is only a shortcut, a read only directory just means it is rebuilt next time
+                pass
+
+        self.cStarts = [c for c, u in offsets] + [fileSize]
+        self.uStarts = [u for c, u in offsets]
+        # the size of the data in the last block is stored in the last 4 bytes of the file
+        lastSize = struct.unpack('<I', os.pread(self.fd, 4, fileSize - 4))[0] if fileSize >= 4 else 0
+        self.size = self.uStarts[-1] + lastSize
+
+    def _blockSizes (self, cPos):
+        ''' Return the compressed size of the block at cPos, read from its BC extra field, and its uncompressed size. '''
+        import os, struct
+        header = os.pread(self.fd, 12, cPos)
+        if header[:2] != b'\x1f\x8b' or not header[3] & 4:
+            raise ValueError('{} is not a BGZF file, block at {} has no extra field'.format(self.fname, cPos))
+        extraLength, = struct.unpack('<H', header[10:12])
+        extra = os.pread(self.fd, extraLength, cPos + 12)
+        # walk the extra subfields until the BC one that holds the block size - 1
+        i = 0
+        while i + 4 <= len(extra):
+            fieldLength, = struct.unpack('<H', extra[i + 2:i + 4])
+            if extra[i:i + 2] == b'BC':
+                blockSize = struct.unpack('<H', extra[i + 4:i + 6])[0] + 1
+                inflatedSize, = struct.unpack('<I', os.pread(self.fd, 4, cPos + blockSize - 4))
+                return blockSize, inflatedSize
+            i += 4 + fieldLength
+        raise ValueError('{} is not a BGZF file, block at {} has no BC field'.format(self.fname, cPos))
+
+    def _inflate (self, block):
+        ''' Read and decompress one block. runs on the thread pool, os.pread and zlib both work without the GIL. '''
+        import os, struct, zlib
+        data = os.pread(self.fd, self.cStarts[block + 1] - self.cStarts[block], self.cStarts[block])
+        extraLength, = struct.unpack('<H', data[10:12])
+        # raw deflate data sits between the header with its extra field and the 8 byte CRC/size trailer
+        return zlib.decompress(data[12 + extraLength:-8], -15)
+
+    def _block (self, block):
+        ''' Return the data of one block, keeping the next blocks decompressing while the file is read in order. '''
+        if block == self.lastBlock + 1:
+            for ahead in range(block, min(block + self.readAhead, len(self.uStarts))):
+                if ahead not in self.pending:
+                    self.pending[ahead] = self.pool.submit(self._inflate, ahead)
+        # after a seek the blocks decompressed ahead are no longer needed
+        for skipped in [ahead for ahead in self.pending if ahead < block or ahead >= block + self.readAhead]:
+            self.pending.pop(skipped).cancel()
+        future = self.pending.pop(block, None)
+        self.lastBlock = block
+        return future.result() if future else self._inflate(block)
+
+    def readable (self):
+        return True
+
+    def seekable (self):
+        return True
+
+    def tell (self):
+        return self.pos
+
+    def seek (self, offset, whence=io.SEEK_SET):
+        ''' Move to an uncompressed position. '''
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.pos = max(offset, 0)
+        return self.pos
+
+    def readinto (self, buffer):
+        ''' Copy data from the current position into buffer, at most up to the end of the current block. '''
+        import bisect
+        if self.pos >= self.size:
+            return 0
+        block = bisect.bisect_right(self.uStarts, self.pos) - 1
+        if self.current is None or self.current[0] != block:
+            self.current = (block, self._block(block))
+        data = self.current[1]
+        inner = self.pos - self.uStarts[block]
+        count = min(len(buffer), len(data) - inner)
+        buffer[:count] = data[inner:inner + count]
+        self.pos += count
+        return count
+
+    def close (self):
+        ''' Stop the decompression threads and close the file. '''
+        import os
+        if not self.closed:
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            os.close(self.fd)
+        super().close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import gzip
+import os
+import subprocess
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+proteins = b'>first protein\nVLSPADKTNV\nKAAW\n>second\nMKCYWWHDERK\n'
+
+
+def table(stdin, *options):
+    ''' The table sequenceAnalysis.py writes for the bytes given on stdin. '''
+    return subprocess.run([sys.executable, os.path.join(here, 'sequenceAnalysis.py'), *options], input = stdin,
+                          stdout = subprocess.PIPE, check = True).stdout.decode()
+
+
+def test_gzip_fasta_on_stdin():
+    # a gzip stream on stdin can only be read once, the format check must not use it up
+    plain = table(proteins)
+    assert table(gzip.compress(proteins)) == plain
+    rows = plain.splitlines()
+    assert [row.split('\t')[:3] for row in rows[1:]] == [['first', '14', '1499.7'], ['second', '11', '1581.8']]
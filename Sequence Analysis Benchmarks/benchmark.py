@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# Benchmarks for the hot paths of the sequence analysis projects
+
+'''
+Times FastAreader.readFasta, NucParams.addSequence, OrfFinder.ORF_find/ORF_final and ProteinParam.pI on the
+bundled FastA files and on synthetic genomes, and writes the results as JSON so runs on different commits can be compared.
+
+usage:
+    python benchmark.py                         bundled files only
+    python benchmark.py -s 10MB -s 100MB        also synthetic genomes of that size (made once with a fixed seed)
+    python benchmark.py -o new.json -c old.json  save the results and print the speedup against an older run
+
+Every stage runs in its own fresh process, so the peak RSS reported for a stage belongs to that stage
+(it includes the python interpreter itself, a few tens of MB).
+'''
+import importlib.util
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+GENOME_DIR = os.path.join(ROOT, 'Genome Sequence Analysis')
+ORF_DIR = os.path.join(ROOT, 'Finding ORF of DNA Seq')
+BUNDLED = [os.path.join(GENOME_DIR, 'haloVolc1_1-genes.fa'), os.path.join(GENOME_DIR, 'testGenome.fa'), os.path.join(ORF_DIR, 'test2.fa')]
+SIZES = {'KB': 1 << 10, 'MB': 1 << 20, 'GB': 1 << 30}
+
+def loadModule (name, folder):
+    ''' Import the sequenceAnalysis.py of one project folder under its own name, both projects have a module with the same name. '''
+    spec = importlib.util.spec_from_file_location(name, os.path.join(folder, 'sequenceAnalysis.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def peakRss ():
+    ''' Peak resident memory of this process in KB (ru_maxrss is in KB on Linux and in bytes on macOS). '''
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+def parseSize (text):
+    ''' Turn 10MB, 1GB or a plain number of bytes into a number of bytes. '''
+    text = text.strip().upper()
+    for unit, factor in SIZES.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+def makeGenome (fileName, size, seed=160):
+    ''' Write a synthetic genome of about size bytes: records of 10 kb to 5 Mb of random ACGT in 60 base lines. The same seed always gives the same file. '''
+    import random
+    rng = random.Random(seed)
+    written = 0
+    record = 0
+    with open(fileName + '.tmp', 'wb') as fileH:
+        while written < size:
+            record += 1
+            length = min(rng.randint(10_000, 5_000_000), max(size - written, 60))
+            header = '>synthetic{} length={}\n'.format(record, length).encode()
+            fileH.write(header)
+            written += len(header)
+            # write the record in 6000 base pieces, 100 lines at a time
+            for start in range(0, length, 6000):
+                bases = rng.choices(b'ACGT', k=min(6000, length - start))
+                lines = b'\n'.join(bytes(bases[i:i + 60]) for i in range(0, len(bases), 60)) + b'\n'
+                fileH.write(lines)
+                written += len(lines)
+    os.replace(fileName + '.tmp', fileName)
+
+def syntheticFile (sizeText, workDir, seed):
+    ''' Return the synthetic genome of that size, making it first when it is not in workDir yet. '''
+    size = parseSize(sizeText)
+    fileName = os.path.join(workDir, 'synthetic-{}-seed{}.fa'.format(sizeText.upper(), seed))
+    if not os.path.exists(fileName):
+        os.makedirs(workDir, exist_ok=True)
+        makeGenome(fileName, size, seed)
+    return fileName
+
+def benchRead (fileName, options):
+    ''' FastAreader.readFasta: bases/s and records/s. '''
+    genome = loadModule('genomeSequenceAnalysis', GENOME_DIR)
+    records = bases = 0
+    start = time.perf_counter()
+    for head, seq in genome.FastAreader(fileName, asBytes=True).readFasta():
+        records += 1
+        bases += len(seq)
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'records': records, 'bases': bases,
+            'basesPerSecond': bases / seconds, 'recordsPerSecond': records / seconds}
+
+def benchNuc (fileName, options):
+    ''' NucParams.addSequence on every record, only the time spent counting. '''
+    genome = loadModule('genomeSequenceAnalysis', GENOME_DIR)
+    nuc = genome.NucParams()
+    bases = 0
+    seconds = 0.0
+    for head, seq in genome.FastAreader(fileName, asBytes=True).readFasta():
+        start = time.perf_counter()
+        nuc.addSequence(seq)
+        seconds += time.perf_counter() - start
+        bases += len(seq)
+    return {'seconds': seconds, 'bases': bases, 'basesPerSecond': bases / seconds}
+
+def benchOrf (fileName, options):
+    ''' OrfFinder.ORF_find and ORF_final on the records, up to orfBases bases so large genomes stay practical. '''
+    orf = loadModule('orfSequenceAnalysis', ORF_DIR)
+    findSeconds = finalSeconds = 0.0
+    bases = records = 0
+    # ORF_final prints every ORF, that output is thrown away
+    stdout = sys.stdout
+    with open(os.devnull, 'w') as devnull:
+        for head, seq in orf.FastAreader(fileName, asBytes=True).readFasta():
+            if bases >= options['orfBases']:
+                break
+            seq = seq[:options['orfBases'] - bases]
+            finder = orf.OrfFinder(seq, minORF = 100)
+            start = time.perf_counter()
+            finder.ORF_find()
+            middle = time.perf_counter()
+            sys.stdout = devnull
+            try:
+                finder.ORF_final()
+            finally:
+                sys.stdout = stdout
+            finalSeconds += time.perf_counter() - middle
+            findSeconds += middle - start
+            bases += len(seq)
+            records += 1
+    seconds = findSeconds + finalSeconds
+    return {'seconds': seconds, 'ORF_find': findSeconds, 'ORF_final': finalSeconds, 'records': records, 'bases': bases,
+            'basesPerSecond': bases / seconds if seconds else 0.0}
+
+def benchProtein (fileName, options):
+    ''' ProteinParam construction and pI on random proteins of 50 to 1000 residues (fixed seed, the file is not used). '''
+    import random
+    genome = loadModule('genomeSequenceAnalysis', GENOME_DIR)
+    rng = random.Random(options['seed'])
+    proteins = [''.join(rng.choices('ACDEFGHIKLMNPQRSTVWY', k=rng.randint(50, 1000))) for i in range(options['proteins'])]
+    start = time.perf_counter()
+    params = [genome.ProteinParam(protein) for protein in proteins]
+    middle = time.perf_counter()
+    for param in params:
+        param.pI()
+    end = time.perf_counter()
+    return {'seconds': end - start, 'ProteinParam': middle - start, 'pI': end - middle, 'proteins': len(proteins),
+            'proteinsPerSecond': len(proteins) / (end - start)}
+
+STAGES = {'readFasta': benchRead, 'addSequence': benchNuc, 'ORF': benchOrf, 'pI': benchProtein}
+
+def runStage (stage, fileName, options):
+    ''' Run one stage and add the peak RSS of the process. called in a fresh worker process. '''
+    result = STAGES[stage](fileName, options)
+    result['peakRssKb'] = peakRss()
+    return result
+
+def gitCommit ():
+    ''' Current commit of the repository, so results can be matched to the code they measured. '''
+    import subprocess
+    try:
+        return subprocess.run(['git', '-C', ROOT, 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare (results, old):
+    ''' Print how much faster every stage is than in an older result file. '''
+    oldInputs = {entry['name']: entry for entry in old['inputs']}
+    print('speedup against {}'.format(old.get('commit')), file=sys.stderr)
+    for entry in results['inputs']:
+        for stage, result in entry['stages'].items():
+            before = oldInputs.get(entry['name'], {}).get('stages', {}).get(stage)
+            if before and result['seconds']:
+                print('{:30s} {:12s} {:8.2f}x'.format(entry['name'], stage, before['seconds'] / result['seconds']), file=sys.stderr)
+
+def main (inOpts=None):
+    ''' Run every stage on every input and write the JSON results. '''
+    import argparse
+    import multiprocessing
+    import platform
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+    parser = argparse.ArgumentParser(description = 'Benchmark the sequence analysis hot paths')
+    parser.add_argument('-s', '--synthetic', action = 'append', default = [], help='size of a synthetic genome to add, like 10MB, 100MB or 1GB')
+    parser.add_argument('--no-bundled', dest='bundled', action='store_false', help='skip the bundled FastA files')
+    parser.add_argument('--stage', action = 'append', choices = list(STAGES), help='only run these stages')
+    parser.add_argument('--seed', type=int, default=160, help='seed of the synthetic genomes and proteins')
+    parser.add_argument('--orf-bases', type=int, default=10_000_000, help='most bases of one input given to OrfFinder')
+    parser.add_argument('--proteins', type=int, default=2000, help='number of random proteins for the pI stage')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'sequence-benchmarks'), help='where synthetic genomes are kept')
+    parser.add_argument('-o', '--output', help='write the JSON here instead of STDOUT')
+    parser.add_argument('-c', '--compare', help='JSON of an older run to compare against')
+    args = parser.parse_args(inOpts)
+
+    fileNames = (BUNDLED if args.bundled else []) + [syntheticFile(size, args.workdir, args.seed) for size in args.synthetic]
+    options = {'seed': args.seed, 'orfBases': args.orf_bases, 'proteins': args.proteins}
+    stages = args.stage or list(STAGES)
+    results = {'commit': gitCommit(), 'python': platform.python_version(), 'machine': platform.machine(),
+               'options': options, 'inputs': []}
+
+    # a fresh spawned process for every stage keeps the peak RSS numbers apart
+    context = multiprocessing.get_context('spawn')
+    for fileName in fileNames:
+        entry = {'name': os.path.basename(fileName), 'bytes': os.path.getsize(fileName), 'stages': {}}
+        for stage in stages:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                entry['stages'][stage] = pool.submit(runStage, stage, fileName, options).result()
+            print('{} {}: {:.3f}s'.format(entry['name'], stage, entry['stages'][stage]['seconds']), file=sys.stderr)
+        results['inputs'].append(entry)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as outH:
+            outH.write(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as oldH:
+            compare(results, json.load(oldH))
+    return results
+
+if __name__ == "__main__":
+    main()